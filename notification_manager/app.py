@@ -1,27 +1,51 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import os
-from datetime import datetime, timedelta
-import requests
+from datetime import date, datetime, timedelta
 import json
 import uuid
+import asyncio
+import contextlib
 import time
 import hmac
 import hashlib
 import base64
 import urllib.parse
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
 from abc import ABC, abstractmethod
 import logging
 import secrets
+import atexit
 from functools import wraps
+from collections import namedtuple
+from itertools import islice
 import redis
-import pickle
 
 from config import get_config
+from cache import CacheManager
+from cache_codecs import get_codec
 from logger import setup_logging
+from dispatcher import ConcurrentDispatcher
+from transport import HTTPTransport
+from delivery_queue import DeliveryQueue, start_embedded_workers
+from rate_limiter import RateLimiter, get_quota, limiter_key
+from retry import is_retryable, backoff_delay
+from circuit_breaker import CircuitBreakerRegistry
+from coalescer import Coalescer, build_digest
+from dedup import MessageDeduplicator
+from smtp_pool import SMTPPool
+from bot_registry import BotRegistry
+from template_engine import TemplateCache, TemplateError, RenderedMessage, message_variant
+from mail_merge import iter_ndjson, render_each, chunked, MergeSummary
+from migrations import upgrade as upgrade_schema
+from stats_counters import UserStatsCounters
+from log_writer import LogWriter
+from retention import LogArchive, archive_logs
+from pagination import CursorError, encode_cursor, decode_cursor, keyset_after
 
 app = Flask(__name__)
 config_class = get_config()
@@ -57,77 +81,82 @@ try:
     # 配置会话Redis连接
     app.config['SESSION_REDIS'] = redis_client
     
+    # 缓存使用二进制连接（缓存值为编码后的字节）
+    cache_redis = redis.Redis(
+        host=app.config['REDIS_HOST'],
+        port=app.config['REDIS_PORT'],
+        db=app.config['REDIS_DB'],
+        password=app.config['REDIS_PASSWORD'],
+        decode_responses=False,
+        socket_timeout=5,
+        socket_connect_timeout=5
+    )
+    
 except Exception as e:
     print(f"❌ Redis连接失败: {e}")
     redis_client = None
+    cache_redis = None
 
-# 缓存管理器
-class CacheManager:
-    """Redis缓存管理器"""
-    
-    def __init__(self, redis_client):
-        self.redis = redis_client
-        self.enabled = redis_client is not None
-    
-    def get(self, key):
-        """获取缓存"""
-        if not self.enabled:
-            return None
-        try:
-            data = self.redis.get(key)
-            if data:
-                return pickle.loads(data.encode('latin1'))
-            return None
-        except Exception as e:
-            app.logger.warning(f"缓存获取失败 {key}: {e}")
-            return None
-    
-    def set(self, key, value, expire=3600):
-        """设置缓存"""
-        if not self.enabled:
-            return False
-        try:
-            data = pickle.dumps(value).decode('latin1')
-            return self.redis.setex(key, expire, data)
-        except Exception as e:
-            app.logger.warning(f"缓存设置失败 {key}: {e}")
-            return False
-    
-    def delete(self, key):
-        """删除缓存"""
-        if not self.enabled:
-            return False
-        try:
-            return self.redis.delete(key)
-        except Exception as e:
-            app.logger.warning(f"缓存删除失败 {key}: {e}")
-            return False
-    
-    def exists(self, key):
-        """检查缓存是否存在"""
-        if not self.enabled:
-            return False
-        try:
-            return self.redis.exists(key)
-        except Exception as e:
-            app.logger.warning(f"缓存检查失败 {key}: {e}")
-            return False
-    
-    def clear_pattern(self, pattern):
-        """清除匹配模式的缓存"""
-        if not self.enabled:
-            return False
-        try:
-            keys = self.redis.keys(pattern)
-            if keys:
-                return self.redis.delete(*keys)
-            return True
-        except Exception as e:
-            app.logger.warning(f"缓存模式清除失败 {pattern}: {e}")
-            return False
+# 初始化缓存管理器（进程内L1 + Redis L2）
+cache = CacheManager(
+    cache_redis,
+    l1_size=app.config['CACHE_L1_SIZE'],
+    l1_ttl=app.config['CACHE_L1_TTL'],
+    channel=app.config['CACHE_INVALIDATION_CHANNEL'],
+    codec=get_codec(app.config['CACHE_CODEC']),
+    batch_size=app.config['CACHE_INVALIDATION_BATCH'],
+    stale_ttl=app.config['CACHE_STALE_TTL'],
+    lock_timeout=app.config['CACHE_LOCK_TIMEOUT'],
+    early_refresh_beta=app.config['CACHE_EARLY_REFRESH_BETA']
+)
+
+# 并发发送调度器（所有请求共享，限制进程内在途的Webhook请求数）
+dispatcher = ConcurrentDispatcher(app.config['DISPATCH_MAX_IN_FLIGHT'])
+
+# 共享HTTP传输层（所有通知机器人复用连接池）
+http_transport = HTTPTransport(
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['HTTP_READ_TIMEOUT'],
+    pool_connections=app.config['HTTP_POOL_CONNECTIONS'],
+    pool_maxsize=app.config['HTTP_POOL_MAXSIZE'],
+    max_response_bytes=app.config['HTTP_MAX_RESPONSE_BYTES']
+)
+
+# SMTP连接池（邮件通知复用已登录的连接）
+smtp_pool = SMTPPool(
+    idle_timeout=app.config['SMTP_IDLE_TIMEOUT'],
+    max_idle_per_key=app.config['SMTP_MAX_IDLE_PER_HOST'],
+    timeout=app.config['SMTP_TIMEOUT'],
+    plaintext_hosts=app.config['SMTP_PLAINTEXT_HOSTS']
+)
+atexit.register(smtp_pool.close_all)
+
+# 出站限流器（配置Redis时多进程共享配额）
+rate_limiter = RateLimiter(
+    redis_client if app.config['RATE_LIMIT_BACKEND'] != 'local' else None,
+    max_wait=app.config['RATE_LIMIT_MAX_WAIT'],
+    max_inline_wait=app.config['RATE_LIMIT_MAX_INLINE_WAIT'],
+    enabled=app.config['RATE_LIMIT_ENABLED']
+)
 
-# 初始化缓存管理器
-cache = CacheManager(redis_client)
+# Webhook熔断器（配置Redis时熔断状态在Worker间共享）
+breakers = CircuitBreakerRegistry(
+    redis_client,
+    window=app.config['BREAKER_WINDOW'],
+    min_calls=app.config['BREAKER_MIN_CALLS'],
+    failure_rate=app.config['BREAKER_FAILURE_RATE'],
+    slow_call_seconds=app.config['BREAKER_SLOW_CALL_SECONDS'],
+    slow_call_rate=app.config['BREAKER_SLOW_CALL_RATE'],
+    open_seconds=app.config['BREAKER_OPEN_SECONDS'],
+    enabled=app.config['BREAKER_ENABLED']
+)
+
+# 重复消息去重窗口（配置Redis时多进程共享）
+deduplicator = MessageDeduplicator(
+    redis_client if app.config['DEDUP_BACKEND'] != 'local' else None,
+    window=app.config['DEDUP_WINDOW'],
+    max_entries=app.config['DEDUP_MAX_ENTRIES']
+)
 
 # 添加自定义Jinja2过滤器
 @app.template_filter('from_json')
@@ -170,37 +199,51 @@ class User(UserMixin, db.Model):
             return False
         return datetime.utcnow() < self.token_expires_at and self.is_active
 
+# Token校验结果（缓存中只保存这几个字段，不缓存ORM对象）
+TokenClaims = namedtuple('TokenClaims', 'id is_active expires_at')
+
 # 带缓存的Token验证函数
 def verify_token_with_cache(token):
-    """使用缓存验证API Token"""
+    """使用缓存验证API Token，有效时返回TokenClaims"""
     if not token:
         return None
     
-    # 先从缓存中查找
-    cache_key = f"api_token:{token}"
-    cached_user = cache.get(cache_key)
-    
-    if cached_user is not None:
-        # 缓存命中，直接返回
-        return cached_user if cached_user else None
-    
-    # 缓存未命中，从数据库查询
+    # 缓存过期时同一Token只查询一次数据库，其他请求使用旧结果或等待查询结果
+    cached = cache.get_or_compute(
+        f"api_token:{token}",
+        lambda: load_token_claims(token),
+        expire=token_cache_ttl,
+        tags=lambda cached: (user_cache_tag(cached['id']),) if cached else ()
+    )
+    if not cached:
+        return None
+    # 缓存期间Token可能已过期，需再检查一次
+    claims = TokenClaims(cached['id'], cached['active'], cached['exp'])
+    if claims.is_active and time.time() < claims.expires_at:
+        return claims
+    return None
+
+def load_token_claims(token):
+    """从数据库查询Token，有效时返回可缓存的校验结果，无效时返回False"""
     user = User.query.filter_by(api_token=token).first()
-    
     if user and user.verify_api_token():
-        # Token有效，缓存用户信息（缓存15分钟）
-        cache.set(cache_key, user, expire=900)
-        return user
-    else:
-        # Token无效，缓存空结果（缓存5分钟避免频繁查询）
-        cache.set(cache_key, False, expire=300)
-        return None
+        expires_at = (user.token_expires_at - datetime(1970, 1, 1)).total_seconds()
+        return {'id': user.id, 'active': user.is_active, 'exp': expires_at}
+    return False
 
-def invalidate_token_cache(token):
-    """使Token缓存失效"""
-    if token:
-        cache_key = f"api_token:{token}"
-        cache.delete(cache_key)
+def token_cache_ttl(cached):
+    """有效Token缓存15分钟（不超过Token有效期），无效Token缓存5分钟避免频繁查询"""
+    if not cached:
+        return 300
+    return max(1, min(900, int(cached['exp'] - time.time())))
+
+def user_cache_tag(user_id):
+    """用户相关缓存（Token校验结果、统计数据）的标签"""
+    return f"user:{user_id}"
+
+def invalidate_user_cache(user_id):
+    """使用户的全部缓存失效（按标签分批删除，不扫描键空间）"""
+    cache.invalidate_tags(user_cache_tag(user_id))
 
 class NotificationPlatform(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -209,19 +252,41 @@ class NotificationPlatform(db.Model):
     platform_type = db.Column(db.String(50), nullable=False)  # feishu, flomo, etc.
     webhook_url = db.Column(db.Text, nullable=False)
     is_active = db.Column(db.Boolean, default=True)
+    rate_limit_per_minute = db.Column(db.Integer)  # 每分钟发送上限，为空时使用平台默认配额
+    coalesce_window = db.Column(db.Integer)  # 合并窗口（秒），窗口内的消息合并为一条摘要发送，为空不合并
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 发送时按用户查询启用的平台（可按名称过滤）；已有数据库由migrations.py创建
+    __table_args__ = (
+        db.Index('ix_notification_platform_user_active_name', 'user_id', 'is_active', 'name'),
+    )
 
 class NotificationLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     platform_id = db.Column(db.Integer, db.ForeignKey('notification_platform.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), nullable=False)  # success, failed, pending
+    status = db.Column(db.String(20), nullable=False)  # success, failed, pending, circuit_open, coalesced, duplicate
     response_code = db.Column(db.Integer)
     error_message = db.Column(db.Text)
     batch_id = db.Column(db.String(50))  # 批量发送ID
     template_id = db.Column(db.Integer, db.ForeignKey('message_template.id'))
+    digest_id = db.Column(db.String(50))  # 合并发送的摘要ID，原始消息与摘要投递日志共用
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 按状态计数/按状态翻页、最近日志按时间倒序、按批次查询；已有数据库由migrations.py创建
+    __table_args__ = (
+        db.Index('ix_notification_log_user_status_sent_at', 'user_id', 'status', 'sent_at'),
+        db.Index('ix_notification_log_user_sent_at', 'user_id', 'sent_at'),
+        db.Index('ix_notification_log_batch_id', 'batch_id'),
+    )
+
+# 用户发送计数（写日志时在同一事务中累加，仪表板直接读取）
+class UserStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    success_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 # 新增消息模板表
 class MessageTemplate(db.Model):
@@ -241,6 +306,36 @@ class MessageTemplate(db.Model):
     user = db.relationship('User', backref='templates')
     logs = db.relationship('NotificationLog', backref='template')
 
+# 异步发送任务表（兼作本地消息队列）
+class DeliveryJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON: message, platform, template_id
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, processing, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+# 死信表：重试耗尽仍失败的消息，可查看并批量重放
+class DeadLetter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    platform_id = db.Column(db.Integer, db.ForeignKey('notification_platform.id'), nullable=False)
+    log_id = db.Column(db.Integer, db.ForeignKey('notification_log.id'))
+    message = db.Column(db.Text, nullable=False)
+    template_id = db.Column(db.Integer)
+    batch_id = db.Column(db.String(50))
+    attempts = db.Column(db.Integer, default=0)
+    last_status_code = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+    variants = db.Column(db.Text)  # 模板消息的平台变体（JSON），重放时按平台格式发送
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    replayed_at = db.Column(db.DateTime)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -278,55 +373,149 @@ def require_api_token(f):
 
 # 通知机器人基类
 class NotificationBot(ABC):
+    # 共享HTTP传输层，可在实例上替换
+    transport = http_transport
+    # 为True时同一平台的多条消息合并为一次send_batch调用（如邮件复用同一个SMTP连接）
+    supports_batch = False
+    # 配置格式错误时的提示，不为空时不会发送
+    config_error = None
+    # 平台类型（选择模板中对应平台的内容变体）
+    platform_type = None
+    
     def __init__(self, webhook_url):
         self.webhook_url = webhook_url
 
     @abstractmethod
     def send_message(self, message):
         pass
+    
+    def send_batch(self, messages):
+        """发送多条消息，返回与messages顺序一致的结果列表"""
+        return [self.send_message(message) for message in messages]
+    
+    async def send_message_async(self, message, transport):
+        """异步发送（ASGI入口使用），非HTTP机器人在线程池中执行同步发送"""
+        return await asyncio.to_thread(self.send_message, message)
+    
+    def _invalid_config(self):
+        return {
+            'success': False,
+            'status_code': 0,
+            'response': self.config_error,
+            'invalid_config': True
+        }
+    
+    @staticmethod
+    def _error(e):
+        return {
+            'success': False,
+            'status_code': 0,
+            'response': str(e)
+        }
+    
+    @staticmethod
+    def _result(response, success, detail, errcode=None):
+        """构造统一的发送结果，附带平台错误码和Retry-After供重试判断"""
+        result = {
+            'success': success,
+            'status_code': response.status_code,
+            'response': detail
+        }
+        if errcode is not None:
+            result['errcode'] = errcode
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            result['retry_after'] = retry_after
+        return result
+
+class HTTPBot(NotificationBot):
+    """通过HTTP接口发送的机器人
 
-class FeishuBot(NotificationBot):
-    def send_message(self, message, mentions=None):
-        headers = {"Content-Type": "application/json"}
+    子类只需实现build_request（构造请求）和parse_response（解析响应），
+    同步发送和ASGI入口的异步发送共用这两部分逻辑。
+    模板消息带有本平台预先渲染好的请求体时，直接发送该请求体（build_payload_request）。
+    """
+    
+    @abstractmethod
+    def build_request(self, message, **options):
+        """返回transport.post的参数: {'url': ..., 'json'/'data': ..., 'headers': ...}"""
+    
+    @abstractmethod
+    def parse_response(self, response):
+        pass
+    
+    def build_payload_request(self, payload):
+        """发送预先渲染好的请求体（bytes）"""
+        return {'url': self.webhook_url, 'headers': {"Content-Type": "application/json"}, 'data': payload}
+    
+    def prepare_request(self, message, **options):
+        text, payload = message_variant(message, self.platform_type)
+        if payload is not None and not options:
+            return self.build_payload_request(payload)
+        return self.build_request(text, **options)
+    
+    def send_message(self, message, **options):
+        if self.config_error:
+            return self._invalid_config()
+        try:
+            response = self.transport.post(**self.prepare_request(message, **options))
+            return self.parse_response(response)
+        except Exception as e:
+            return self._error(e)
+    
+    async def send_message_async(self, message, transport):
+        if self.config_error:
+            return self._invalid_config()
+        try:
+            response = await transport.post(**self.prepare_request(message))
+            return self.parse_response(response)
+        except Exception as e:
+            return self._error(e)
+    
+    def _errcode_result(self, response):
+        """钉钉/企业微信风格的响应: {"errcode": 0, "errmsg": "ok"}"""
+        result = response.json()
+        return self._result(
+            response,
+            result.get('errcode') == 0,
+            result.get('errmsg', response.text),
+            errcode=result.get('errcode')
+        )
+
+class FeishuBot(HTTPBot):
+    platform_type = 'feishu'
+    
+    def build_request(self, message, mentions=None):
         content = {"text": message}
         if mentions:
             content["text"] = f"<at user_id=\"{mentions}\">{message}</at>"
         payload = {"msg_type": "text", "content": content}
-        
-        try:
-            response = requests.post(self.webhook_url, headers=headers, data=json.dumps(payload))
-            return {
-                'success': response.status_code == 200,
-                'status_code': response.status_code,
-                'response': response.text
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return {
+            'url': self.webhook_url,
+            'headers': {"Content-Type": "application/json"},
+            'data': json.dumps(payload)
+        }
+    
+    def parse_response(self, response):
+        return self._result(response, response.status_code == 200, response.text)
 
-class FlomoBot(NotificationBot):
-    def send_message(self, message):
-        headers = {"Content-Type": "application/json"}
+class FlomoBot(HTTPBot):
+    platform_type = 'flomo'
+    
+    def build_request(self, message):
         data = {"content": message}
-        
-        try:
-            response = requests.post(self.webhook_url, headers=headers, data=json.dumps(data))
-            return {
-                'success': response.status_code == 200,
-                'status_code': response.status_code,
-                'response': response.text
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return {
+            'url': self.webhook_url,
+            'headers': {"Content-Type": "application/json"},
+            'data': json.dumps(data)
+        }
+    
+    def parse_response(self, response):
+        return self._result(response, response.status_code == 200, response.text)
 
-class DingTalkBot(NotificationBot):
+class DingTalkBot(HTTPBot):
+    platform_type = 'dingtalk'
+    
     def __init__(self, webhook_url, secret=None):
         super().__init__(webhook_url)
         self.secret = secret
@@ -345,19 +534,33 @@ class DingTalkBot(NotificationBot):
         sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
         return sign
     
-    def send_message(self, message, msg_type='text', at_mobiles=None, at_all=False):
-        """发送钉钉消息"""
+    def _signed_url(self):
+        """签名带时间戳，每次发送重新计算"""
         timestamp = str(round(time.time() * 1000))
         sign = self._generate_sign(timestamp)
         
         url = self.webhook_url
         if sign:
             url += f'&timestamp={timestamp}&sign={sign}'
+        return url
+    
+    def build_request(self, message, msg_type='text', at_mobiles=None, at_all=False, title=None):
+        """构造钉钉消息请求"""
+        url = self._signed_url()
         
-        payload = {
-            'msgtype': msg_type,
-            msg_type: {'content': message}
-        }
+        if msg_type == 'markdown':
+            payload = {
+                'msgtype': 'markdown',
+                'markdown': {
+                    'title': title,
+                    'text': message
+                }
+            }
+        else:
+            payload = {
+                'msgtype': msg_type,
+                msg_type: {'content': message}
+            }
         
         # 添加@功能
         if at_mobiles or at_all:
@@ -366,52 +569,24 @@ class DingTalkBot(NotificationBot):
                 'isAtAll': at_all
             }
         
-        try:
-            response = requests.post(url, json=payload, headers={'Content-Type': 'application/json'})
-            result = response.json()
-            
-            return {
-                'success': result.get('errcode') == 0,
-                'status_code': response.status_code,
-                'response': result.get('errmsg', response.text)
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return {'url': url, 'json': payload, 'headers': {'Content-Type': 'application/json'}}
+    
+    def build_payload_request(self, payload):
+        return {'url': self._signed_url(), 'headers': {'Content-Type': 'application/json'}, 'data': payload}
+    
+    def parse_response(self, response):
+        return self._errcode_result(response)
     
     def send_markdown(self, title, content):
         """发送Markdown消息"""
-        payload = {
-            'msgtype': 'markdown',
-            'markdown': {
-                'title': title,
-                'text': content
-            }
-        }
-        
-        try:
-            response = requests.post(self.webhook_url, json=payload, headers={'Content-Type': 'application/json'})
-            result = response.json()
-            
-            return {
-                'success': result.get('errcode') == 0,
-                'status_code': response.status_code,
-                'response': result.get('errmsg', response.text)
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return self.send_message(content, msg_type='markdown', title=title)
 
-class WeworkBot(NotificationBot):
+class WeworkBot(HTTPBot):
     """企业微信机器人"""
-    def send_message(self, message, msg_type='text', mentioned_list=None):
-        """发送企业微信消息"""
+    platform_type = 'wework'
+    
+    def build_request(self, message, msg_type='text', mentioned_list=None):
+        """构造企业微信消息请求"""
         payload = {
             'msgtype': msg_type,
             msg_type: {'content': message}
@@ -421,55 +596,19 @@ class WeworkBot(NotificationBot):
         if mentioned_list:
             payload[msg_type]['mentioned_list'] = mentioned_list
         
-        try:
-            response = requests.post(
-                self.webhook_url, 
-                json=payload, 
-                headers={'Content-Type': 'application/json'}
-            )
-            result = response.json()
-            
-            return {
-                'success': result.get('errcode') == 0,
-                'status_code': response.status_code,
-                'response': result.get('errmsg', response.text)
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return {'url': self.webhook_url, 'json': payload, 'headers': {'Content-Type': 'application/json'}}
+    
+    def parse_response(self, response):
+        return self._errcode_result(response)
     
     def send_markdown(self, content):
         """发送Markdown消息"""
-        payload = {
-            'msgtype': 'markdown',
-            'markdown': {'content': content}
-        }
-        
-        try:
-            response = requests.post(
-                self.webhook_url, 
-                json=payload, 
-                headers={'Content-Type': 'application/json'}
-            )
-            result = response.json()
-            
-            return {
-                'success': result.get('errcode') == 0,
-                'status_code': response.status_code,
-                'response': result.get('errmsg', response.text)
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return self.send_message(content, msg_type='markdown')
 
-class TelegramBot(NotificationBot):
+class TelegramBot(HTTPBot):
     """Telegram机器人"""
+    platform_type = 'telegram'
+    
     def __init__(self, webhook_url):
         # webhook_url格式: bot_token:chat_id
         super().__init__(webhook_url)
@@ -480,41 +619,43 @@ class TelegramBot(NotificationBot):
         else:
             self.bot_token = webhook_url
             self.chat_id = None
+            self.config_error = 'Invalid webhook format. Use: bot_token:chat_id'
+        self.api_url = f'https://api.telegram.org/bot{self.bot_token}/sendMessage'
+        self._chat_id_field = ('{"chat_id":' + json.dumps(self.chat_id)).encode('utf-8')
     
-    def send_message(self, message, parse_mode='HTML'):
-        """发送Telegram消息"""
-        if not self.chat_id:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': 'Invalid webhook format. Use: bot_token:chat_id'
-            }
-        
-        url = f'https://api.telegram.org/bot{self.bot_token}/sendMessage'
+    def build_request(self, message, parse_mode='HTML'):
+        """构造Telegram消息请求"""
         payload = {
             'chat_id': self.chat_id,
             'text': message,
             'parse_mode': parse_mode
         }
-        
-        try:
-            response = requests.post(url, json=payload)
-            result = response.json()
-            
-            return {
-                'success': result.get('ok', False),
-                'status_code': response.status_code,
-                'response': result.get('description', response.text)
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return {'url': self.api_url, 'json': payload}
+    
+    def build_payload_request(self, payload):
+        """预渲染的请求体不含chat_id，在字节层面拼接到对象开头"""
+        rest = payload.lstrip()[1:]
+        if rest.lstrip() != b'}':
+            rest = b',' + rest
+        return {'url': self.api_url, 'headers': {'Content-Type': 'application/json'},
+                'data': self._chat_id_field + rest}
+    
+    def parse_response(self, response):
+        result = response.json()
+        return self._result(
+            response,
+            result.get('ok', False),
+            result.get('description', response.text),
+            errcode=result.get('error_code')
+        )
 
 class EmailBot(NotificationBot):
     """邮件通知"""
+    platform_type = 'email'
+    # 共享SMTP连接池，可在实例上替换
+    smtp_pool = smtp_pool
+    supports_batch = True
+    
     def __init__(self, webhook_url):
         # webhook_url格式: smtp_host:port:username:password:to_email
         super().__init__(webhook_url)
@@ -527,91 +668,781 @@ class EmailBot(NotificationBot):
             self.to_email = ':'.join(parts[4:])  # 处理邮箱中可能的冒号
         else:
             self.smtp_host = None
+            self.config_error = 'Invalid config. Use: smtp_host:port:username:password:to_email'
+    
+    def _build_message(self, message, subject):
+        msg = MIMEMultipart()
+        msg['From'] = self.username
+        msg['To'] = self.to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(message_variant(message, self.platform_type)[0], 'plain', 'utf-8'))
+        return (self.username, self.to_email, msg.as_string())
     
     def send_message(self, message, subject='通知消息'):
         """发送邮件"""
-        if not self.smtp_host:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': 'Invalid config. Use: smtp_host:port:username:password:to_email'
-            }
+        return self.send_batch([message], subject=subject)[0]
+    
+    def send_batch(self, messages, subject='通知消息'):
+        """通过同一个SMTP连接发送多封邮件"""
+        if self.config_error:
+            return [self._invalid_config() for _ in messages]
         
         try:
-            import smtplib
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            
-            msg = MIMEMultipart()
-            msg['From'] = self.username
-            msg['To'] = self.to_email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(message, 'plain', 'utf-8'))
-            
-            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port)
-            server.login(self.username, self.password)
-            server.sendmail(self.username, self.to_email, msg.as_string())
-            server.quit()
-            
-            return {
-                'success': True,
-                'status_code': 200,
-                'response': 'Email sent successfully'
-            }
+            envelopes = [self._build_message(message, subject) for message in messages]
+            errors = self.smtp_pool.send_many(
+                self.smtp_host, self.smtp_port, self.username, self.password, envelopes
+            )
         except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+            errors = [e] * len(messages)
+        
+        return [{
+            'success': True,
+            'status_code': 200,
+            'response': 'Email sent successfully'
+        } if error is None else self._error(error) for error in errors]
 
-class WebhookBot(NotificationBot):
+class WebhookBot(HTTPBot):
     """通用Webhook"""
-    def send_message(self, message):
-        """发送到通用Webhook"""
+    platform_type = 'webhook'
+    
+    def build_request(self, message):
+        """构造通用Webhook请求"""
         payload = {
             'message': message,
             'timestamp': datetime.utcnow().isoformat(),
             'source': 'notification_manager'
         }
-        
-        try:
-            response = requests.post(
-                self.webhook_url, 
-                json=payload, 
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            return {
-                'success': response.status_code in [200, 201, 204],
-                'status_code': response.status_code,
-                'response': response.text[:500] if response.text else 'OK'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'status_code': 0,
-                'response': str(e)
-            }
+        return {'url': self.webhook_url, 'json': payload, 'headers': {'Content-Type': 'application/json'}}
+    
+    def parse_response(self, response):
+        return self._result(
+            response,
+            response.status_code in [200, 201, 204],
+            response.text[:500] if response.text else 'OK'
+        )
+
+# 支持的平台类型
+BOT_CLASSES = {
+    'feishu': FeishuBot,
+    'flomo': FlomoBot,
+    'dingtalk': DingTalkBot,
+    'wework': WeworkBot,
+    'telegram': TelegramBot,
+    'email': EmailBot,
+    'webhook': WebhookBot
+}
+
+# 机器人实例缓存（平台编辑/删除时失效）
+bot_registry = BotRegistry(BOT_CLASSES)
 
 # Bot工厂函数
 def get_bot(platform_type, webhook_url):
     """根据平台类型获取对应的Bot实例"""
-    bots = {
-        'feishu': FeishuBot,
-        'flomo': FlomoBot,
-        'dingtalk': DingTalkBot,
-        'wework': WeworkBot,
-        'telegram': TelegramBot,
-        'email': EmailBot,
-        'webhook': WebhookBot
+    return bot_registry.create(platform_type, webhook_url)
+
+# 调度线程中执行的发送任务（只携带发送所需的数据，不在线程间传递ORM对象）
+# 一般每个任务一条消息；supports_batch的机器人同一平台的多条消息合并为一个任务
+SendTask = namedtuple('SendTask', 'indexes bot messages limit_key quota breaker_key')
+
+def plan_sends(items, fresh=True, reserved=()):
+    """把 (platform, message) 列表整理成发送任务
+
+    返回 (tasks, results)：results与items顺序一致，去重/合并的消息已填入结果，
+    其余位置等待任务执行后填入，不支持的平台类型保持为None。
+    fresh为True表示新收到的消息：去重窗口内的重复消息直接忽略，
+    设置了合并窗口的平台不立即发送，而是加入摘要缓冲区；重试和摘要投递传False。
+    reserved为已预占限流令牌的消息序号（限流延迟发送的消息），发送时不再限流。
+    """
+    tasks = []
+    batch_tasks = {}  # platform.id -> 可批量发送的任务
+    results = [None] * len(items)
+    duplicates = [False] * len(items)
+    if fresh:
+        duplicates = deduplicator.check_many([(platform.user_id, platform.id, message) for platform, message in items])
+    for index, (platform, message) in enumerate(items):
+        if duplicates[index]:
+            # 不调用Webhook，也不代表本次发送成功：原消息可能仍在发送或等待重试
+            results[index] = {
+                'success': False,
+                'status_code': 0,
+                'response': '去重窗口内的重复消息，已忽略',
+                'duplicate': True
+            }
+            continue
+        
+        if fresh and platform.coalesce_window:
+            digest_id = coalescer.add(platform.id, platform.coalesce_window, message)
+            results[index] = {
+                'success': True,
+                'status_code': 202,
+                'response': '已合并到摘要消息',
+                'coalesced': True,
+                'digest_id': digest_id
+            }
+            continue
+        
+        bot = bot_registry.get(platform)
+        if bot is None:
+            continue
+        
+        limited = index not in reserved
+        batched = batch_tasks.get((platform.id, limited))
+        if batched is not None:
+            batched.indexes.append(index)
+            batched.messages.append(message)
+            continue
+        
+        task = SendTask(
+            indexes=[index],
+            bot=bot,
+            messages=[message],
+            limit_key=limiter_key(platform.platform_type, platform.webhook_url),
+            quota=get_quota(platform.platform_type, platform.rate_limit_per_minute) if limited else None,
+            breaker_key=platform.id
+        )
+        tasks.append(task)
+        if bot.supports_batch:
+            batch_tasks[(platform.id, limited)] = task
+    return tasks, results
+
+def merge_sent(tasks, sent, results):
+    """把各任务的发送结果填回results"""
+    for task, task_results in zip(tasks, sent):
+        for index, result in zip(task.indexes, task_results):
+            results[index] = result
+    return results
+
+def send_messages(items, fresh=True, reserved=()):
+    """并发发送多条 (platform, message)
+
+    返回与items顺序一致的结果列表，不支持的平台类型对应的结果为None
+    """
+    tasks, results = plan_sends(items, fresh, reserved)
+    results = merge_sent(tasks, dispatcher.run(_send_task, tasks), results)
+    if fresh:
+        release_failed_claims(items, results)
+    return results
+
+async def send_messages_async(items, transport, limit=None, fresh=True):
+    """send_messages的asyncio版本（ASGI入口使用）
+
+    HTTP机器人通过异步transport发送，limit为限制在途请求数的asyncio.Semaphore。
+    去重（Redis）和摘要合并在线程池中整理任务，不阻塞事件循环
+    """
+    tasks, results = await asyncio.to_thread(plan_sends, items, fresh)
+    sent = await asyncio.gather(*(_send_task_async(task, transport, limit) for task in tasks))
+    results = merge_sent(tasks, sent, results)
+    if fresh and deduplicator.enabled:
+        await asyncio.to_thread(release_failed_claims, items, results)
+    return results
+
+def release_failed_claims(items, results):
+    """发送失败且不会重试的消息释放去重记录，客户端重试时重新发送而不是被当作重复忽略"""
+    if not deduplicator.enabled:
+        return
+    released = []
+    for (platform, message), result in zip(items, results):
+        if result is not None and (result['success'] or result.get('duplicate') or result.get('coalesced')
+                                   or result.get('deferred')):
+            continue
+        if result is not None and retry_enabled() and is_retryable(result):
+            continue  # 已安排重试，仍占用去重记录
+        released.append((platform.user_id, platform.id, message))
+    deduplicator.release_many(released)
+
+def flush_digest(platform_id, digest_id, window, messages):
+    """合并窗口到期：把缓冲的消息合成一条摘要发送，并记录摘要投递日志"""
+    with app.app_context():
+        platform = db.session.get(NotificationPlatform, platform_id)
+        if not platform or not platform.is_active:
+            return
+        
+        digest = build_digest(messages, window, app.config['COALESCE_MAX_BODIES'])
+        result = send_messages([(platform, digest)], fresh=False)[0]
+        if result is None:
+            result = {'success': False, 'status_code': 0, 'response': '不支持的平台类型'}
+        
+        record_results(platform.user_id, [(platform, digest, result)], digest_id=digest_id)
+        db.session.commit()
+        invalidate_user_stats_cache(platform.user_id)
+
+# 突发消息合并器（进程退出前发送未到期的摘要）
+coalescer = Coalescer(flush_digest, max_messages=app.config['COALESCE_MAX_MESSAGES'])
+atexit.register(coalescer.flush_all)
+
+def _send_task(task):
+    """调度线程中执行：熔断检查 -> 按平台配额限流 -> 调用机器人发送
+
+    限流只在线程中短暂等待（RATE_LIMIT_MAX_INLINE_WAIT），需要更长等待的消息返回deferred结果，
+    由record_results放入发送队列延迟发送。返回与task.messages顺序一致的结果列表
+    """
+    if not breakers.allow(task.breaker_key):
+        return _circuit_open_results(task)
+    
+    slots = [rate_limiter.acquire(task.limit_key, task.quota) for _ in task.messages]
+    results, ready = _split_rate_limited(task, slots)
+    if not ready:
+        return results
+    
+    messages = [task.messages[position] for position in ready]
+    started = time.monotonic()
+    if len(messages) == 1:
+        sent = [task.bot.send_message(messages[0])]
+    else:
+        sent = task.bot.send_batch(messages)
+    _record_breaker(task, sent, started)
+    for position, result in zip(ready, sent):
+        results[position] = result
+    return results
+
+async def _send_task_async(task, transport, limit=None):
+    """_send_task的asyncio版本，限流等待不占用线程，熔断和限流读写Redis时在线程池中执行"""
+    if not await breakers.allow_async(task.breaker_key):
+        return _circuit_open_results(task)
+    
+    slots = [await rate_limiter.acquire_async(task.limit_key, task.quota) for _ in task.messages]
+    results, ready = _split_rate_limited(task, slots)
+    if not ready:
+        return results
+    
+    messages = [task.messages[position] for position in ready]
+    if limit is None:
+        limit = contextlib.nullcontext()
+    async with limit:
+        started = time.monotonic()
+        if len(messages) == 1:
+            sent = [await task.bot.send_message_async(messages[0], transport)]
+        else:
+            sent = await asyncio.to_thread(task.bot.send_batch, messages)
+    await breakers.record_async(task.breaker_key, *_breaker_outcome(sent, started))
+    for position, result in zip(ready, sent):
+        results[position] = result
+    return results
+
+def _split_rate_limited(task, slots):
+    """按限流结果拆分任务：返回 (results, 可立即发送的位置)，需要延迟发送的消息已填入结果
+
+    slots为各消息的 (延迟秒数, 是否已预占令牌)
+    """
+    results = [None] * len(task.messages)
+    ready = []
+    for position, (delay, reserved) in enumerate(slots):
+        if delay > 0:
+            results[position] = _deferred_result(delay, reserved)
+        else:
+            ready.append(position)
+    if not ready:
+        breakers.release(task.breaker_key)
+    return results, ready
+
+def _circuit_open_results(task):
+    return [{
+        'success': False,
+        'status_code': 0,
+        'response': '平台熔断中，已快速失败',
+        'circuit_open': True
+    } for _ in task.messages]
+
+def _deferred_result(delay, reserved):
+    # 消息记为pending并放入发送队列：已预占令牌时到该时间直接发送，
+    # 未预占（超过RATE_LIMIT_MAX_WAIT）时delay为下一个空闲时间，届时重新获取令牌；都不计入重试次数
+    return {
+        'success': False,
+        'status_code': 202,
+        'response': f'超出平台发送频率限制，{delay:.1f}秒后发送',
+        'deferred': True,
+        'reserved': reserved,
+        'retry_after': delay
+    }
+
+def _record_breaker(task, results, started):
+    breakers.record(task.breaker_key, *_breaker_outcome(results, started))
+
+def _breaker_outcome(results, started):
+    # 批量发送按单条平均耗时判断慢调用
+    return all(result['success'] for result in results), (time.monotonic() - started) / len(results)
+
+def send_to_platforms(platforms, message):
+    """并发发送消息到多个平台
+
+    返回 (platform, result) 列表，顺序与platforms一致；不支持的平台类型会被跳过
+    """
+    results = send_messages([(platform, message) for platform in platforms])
+    return [(platform, result) for platform, result in zip(platforms, results) if result is not None]
+
+def build_log_entry(user_id, platform_id, message, result, template_id=None, batch_id=None, digest_id=None):
+    """根据发送结果构造NotificationLog字段"""
+    return {
+        'user_id': user_id,
+        'platform_id': platform_id,
+        'template_id': template_id,
+        'batch_id': batch_id,
+        'digest_id': result.get('digest_id', digest_id),
+        'message': message,
+        'status': result_status(result),
+        'response_code': result['status_code'],
+        'error_message': result['response'] if not result['success'] and not result.get('duplicate') else None,
+        'sent_at': datetime.utcnow()
     }
+
+def result_status(result):
+    """发送结果对应的日志状态，熔断快速失败单独记为circuit_open"""
+    if result.get('duplicate'):
+        return 'duplicate'
+    if result.get('coalesced'):
+        return 'coalesced'
+    if result.get('deferred'):
+        return 'pending'
+    if result['success']:
+        return 'success'
+    if result.get('circuit_open'):
+        return 'circuit_open'
+    return 'failed'
+
+def get_target_platforms(user_id, platform_name=None):
+    """获取用户启用的平台（PlatformSnapshot列表），可按名称过滤
+
+    从缓存的路由表读取，平台增删改时失效；稳定状态下发送不再查询平台表。
+    """
+    routes = get_routing_table(user_id)
+    if platform_name:
+        return [PlatformSnapshot(*row) for row in routes.get(platform_name, ())]
+    rows = [row for rows in routes.values() for row in rows]
+    rows.sort(key=lambda row: row[0])
+    return [PlatformSnapshot(*row) for row in rows]
+
+def get_routing_table(user_id):
+    """用户的路由表：平台名称 -> 启用平台的快照字段列表"""
+    return cache.get_or_compute(
+        routing_cache_key(user_id),
+        lambda: load_routing_table(user_id),
+        expire=app.config['ROUTING_CACHE_TTL'],
+        tags=(user_cache_tag(user_id),)
+    )
+
+def load_routing_table(user_id):
+    platforms = NotificationPlatform.query.filter_by(
+        user_id=user_id, 
+        is_active=True
+    ).order_by(NotificationPlatform.id).all()
+    routes = {}
+    for platform in platforms:
+        routes.setdefault(platform.name, []).append(list(snapshot_platform(platform)))
+    return routes
+
+def routing_cache_key(user_id):
+    return f"routes:{user_id}"
+
+def invalidate_routing_table(user_id):
+    """平台增删改后使路由表缓存失效"""
+    cache.delete(routing_cache_key(user_id))
+
+def summarize_result(platform, result):
+    """API响应中单个平台的发送结果，被去重忽略的平台只返回duplicate标记"""
+    if result.get('duplicate'):
+        return {'platform': platform.name, 'duplicate': True}
+    summary = {
+        'platform': platform.name,
+        'success': result['success'],
+        'status_code': result['status_code']
+    }
+    if result.get('coalesced'):
+        summary.update(coalesced=True, digest_id=result['digest_id'])
+    elif result.get('circuit_open'):
+        summary['circuit_open'] = True
+    elif result.get('deferred'):
+        summary.update(deferred=True, retry_after=round(result['retry_after'], 1))
+    elif not result['success'] and retry_enabled() and is_retryable(result):
+        summary['retrying'] = True
+    return summary
+
+def count_duplicates(summaries):
+    """发送结果中被去重窗口忽略的平台数"""
+    return sum(1 for summary in summaries if summary.get('duplicate'))
+
+def retry_enabled():
+    return app.config['RETRY_MAX_ATTEMPTS'] > 0
+
+def record_results(user_id, sent, template_id=None, batch_id=None, digest_id=None):
+    """记录发送日志（不提交事务）
+
+    sent为 (platform, message, result) 列表。限流延迟的消息和可重试的失败记为pending，
+    分别放入发送队列延迟发送、安排重试任务；其余结果一次性批量插入，LOG_WRITE_MODE=async时交给后台写入线程。
+    """
+    entries = []
+    for platform, message, result in sent:
+        entry = build_log_entry(user_id, platform.id, message, result, template_id=template_id,
+                                batch_id=batch_id, digest_id=digest_id)
+        deferred = result.get('deferred')
+        if deferred or (retry_enabled() and is_retryable(result)):
+            entry['status'] = 'pending'
+            log = NotificationLog(**entry)
+            db.session.add(log)
+            db.session.flush()  # 获取日志ID供重试任务引用
+            variants = message.to_dict() if isinstance(message, RenderedMessage) else None
+            if deferred:
+                schedule_deferred(log, 0, result['retry_after'], result['reserved'], variants=variants)
+            else:
+                schedule_retry(log, 1, retry_after=result.get('retry_after'), variants=variants)
+        else:
+            entries.append(entry)
     
-    bot_class = bots.get(platform_type.lower())
-    if bot_class:
-        return bot_class(webhook_url)
+    if entries and app.config['LOG_WRITE_MODE'] == 'async':
+        # 交给后台组提交；队列已满时退回的部分仍在当前事务中写入
+        entries = log_writer.submit(entries)
+    if entries:
+        write_log_entries(entries)
+
+def write_log_entries(entries):
+    """批量插入日志并累加用户计数（不提交事务）"""
+    db.session.bulk_insert_mappings(NotificationLog, entries)
+    stats_counters.record([(entry['user_id'], None, entry['status']) for entry in entries])
+
+def write_log_batch(entries):
+    """后台日志写入线程执行：一批日志一个事务"""
+    with app.app_context():
+        try:
+            write_log_entries(entries)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for user_id in {entry['user_id'] for entry in entries}:
+            invalidate_user_stats_cache(user_id)
+
+def schedule_retry(log, attempt, retry_after=None, variants=None):
+    """为pending日志安排第attempt次重试（由发送Worker执行，不阻塞API线程）
+
+    variants为模板消息的平台变体（RenderedMessage.to_dict()），日志只保存默认文本，重试时据此按平台格式重建
+    """
+    delay = backoff_delay(
+        attempt,
+        base=app.config['RETRY_BASE_DELAY'],
+        cap=app.config['RETRY_MAX_DELAY'],
+        retry_after=retry_after
+    )
+    delivery_queue.enqueue(log.user_id, retry_payload(log, attempt, variants), batch_id=log.batch_id, delay=delay)
+
+def schedule_deferred(log, attempt, delay, reserved=True, variants=None):
+    """限流延迟的消息：delay秒后由发送Worker发送，attempt为已失败的次数（延迟不计入重试次数）
+
+    reserved为True时令牌已按该时间预占，发送时不再获取令牌；否则到时重新获取
+    """
+    payload = retry_payload(log, attempt, variants)
+    if reserved:
+        payload['reserved'] = True
+    delivery_queue.enqueue(log.user_id, payload, batch_id=log.batch_id, delay=delay)
+
+def retry_payload(log, attempt, variants=None):
+    payload = {
+        'kind': 'retry',
+        'log_id': log.id,
+        'attempt': attempt
+    }
+    if variants:
+        payload['variants'] = variants
+    return payload
+
+def deliver_message(user_id, platforms, message, template_id=None, batch_id=None):
+    """发送消息并记录日志（不提交事务），返回每个平台的发送结果"""
+    sent = send_to_platforms(platforms, message)
+    record_results(user_id, [(platform, message, result) for platform, result in sent],
+                   template_id=template_id, batch_id=batch_id)
+    return [summarize_result(platform, result) for platform, result in sent]
+
+# 用户发送计数
+stats_counters = UserStatsCounters(db, UserStats, NotificationLog, User)
+
+# 发送日志后台写入（LOG_WRITE_MODE=async时使用，进程退出前写完队列）
+log_writer = LogWriter(
+    write_log_batch,
+    max_queue=app.config['LOG_WRITER_QUEUE_SIZE'],
+    batch_size=app.config['LOG_WRITER_BATCH_SIZE'],
+    flush_interval=app.config['LOG_WRITER_INTERVAL']
+)
+atexit.register(log_writer.stop)
+
+# 发送日志归档目录（python retention.py 定期执行归档），相对路径位于instance目录下
+log_archive = LogArchive(os.path.join(app.instance_path, app.config['LOG_ARCHIVE_DIR']))
+
+def release_archived_logs(rows):
+    """归档删除日志前：死信不再引用这些日志（重放时按死信内容重建日志），用户计数扣除这些日志"""
+    DeadLetter.query.filter(DeadLetter.log_id.in_([row['id'] for row in rows]))\
+                    .update({'log_id': None}, synchronize_session=False)
+    stats_counters.record([(row['user_id'], row['status'], None) for row in rows])
+
+def archive_expired_logs(cutoff, dry_run=False):
+    """归档并删除cutoff之前的日志（除等待重试的日志）"""
+    user_ids = set()
+    
+    def before_delete(rows):
+        release_archived_logs(rows)
+        user_ids.update(row['user_id'] for row in rows)
+    
+    summary = archive_logs(db.session, NotificationLog.__table__, log_archive, cutoff,
+                           batch_size=app.config['LOG_RETENTION_BATCH'],
+                           before_delete=before_delete, dry_run=dry_run)
+    for user_id in user_ids:
+        invalidate_user_stats_cache(user_id)
+    return summary
+
+# 异步发送队列
+delivery_queue = DeliveryQueue(db, DeliveryJob, lock_timeout=app.config['DELIVERY_LOCK_TIMEOUT'])
+
+def use_async_delivery(data):
+    """请求体中的async字段优先，否则使用DELIVERY_MODE配置"""
+    if 'async' in data:
+        return bool(data['async'])
+    return app.config['DELIVERY_MODE'] == 'async'
+
+def get_api_token(data):
+    """从Authorization Header或请求体中获取API Token"""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header[7:]  # 移除 "Bearer " 前缀
+    if data and 'token' in data:
+        return data['token']
     return None
 
+def enqueue_send_job(send_request):
+    """将发送任务写入队列并提交，返回202响应体"""
+    payload = {
+        'message': send_request.message,
+        'platform': send_request.platform_name,
+        'template_id': send_request.template.id if send_request.template else None
+    }
+    if isinstance(send_request.message, RenderedMessage):
+        payload['variants'] = send_request.message.to_dict()
+    job = delivery_queue.enqueue(send_request.user_id, payload)
+    db.session.commit()
+    
+    return {
+        'message': '通知已加入发送队列',
+        'batch_id': job.batch_id,
+        'job_id': job.id
+    }
+
+def enqueue_delivery(send_request):
+    """将发送任务写入队列，返回202响应"""
+    return jsonify(enqueue_send_job(send_request)), 202
+
+# 平台发送配置快照（脱离数据库会话后仍可安全使用，如在事件循环中发送）
+PlatformSnapshot = namedtuple(
+    'PlatformSnapshot',
+    'id user_id name platform_type webhook_url rate_limit_per_minute coalesce_window'
+)
+
+def snapshot_platform(platform):
+    if isinstance(platform, PlatformSnapshot):
+        return platform
+    return PlatformSnapshot(
+        id=platform.id,
+        user_id=platform.user_id,
+        name=platform.name,
+        platform_type=platform.platform_type,
+        webhook_url=platform.webhook_url,
+        rate_limit_per_minute=platform.rate_limit_per_minute,
+        coalesce_window=platform.coalesce_window
+    )
+
+# 模板编译缓存
+template_cache = TemplateCache(platform_types=BOT_CLASSES)
+
+# 单条发送请求（/api/send 和 /api/send_template 的Flask、ASGI入口共用）
+SendRequest = namedtuple('SendRequest', 'user_id platforms message platform_name template')
+
+def authenticate_token(token):
+    """校验API Token，返回 (user, None) 或 (None, (错误信息, 状态码))"""
+    if not token:
+        return None, ({'error': '缺少认证Token'}, 401)
+    
+    # 使用缓存验证Token
+    user = verify_token_with_cache(token)
+    if not user:
+        return None, ({'error': '无效的token'}, 401)
+    return user, None
+
+def resolve_send_request(data, token):
+    """校验/api/send请求，返回 (SendRequest, None) 或 (None, (错误信息, 状态码))"""
+    if not data or 'message' not in data:
+        return None, ({'error': '缺少必要参数'}, 400)
+    
+    user, error = authenticate_token(token)
+    if error:
+        return None, error
+    
+    # 获取用户的平台
+    platform_name = data.get('platform', None)
+    platforms = get_target_platforms(user.id, platform_name)
+    if not platforms:
+        return None, ({'error': '没有找到可用的通知平台'}, 404)
+    
+    return SendRequest(user.id, platforms, data['message'], platform_name, None), None
+
+def resolve_template_request(data, token):
+    """校验/api/send_template请求并渲染模板，返回 (SendRequest, None) 或 (None, (错误信息, 状态码))"""
+    if not data or 'template_id' not in data:
+        return None, ({'error': '缺少必要参数'}, 400)
+    
+    user, error = authenticate_token(token)
+    if error:
+        return None, error
+    
+    template, error = load_template(data['template_id'], user.id)
+    if error:
+        return None, error
+    
+    # 渲染模板内容（编译结果按模板ID和更新时间缓存）
+    variables = data.get('variables') or {}
+    if not isinstance(variables, dict):
+        return None, ({'error': 'variables必须是对象'}, 400)
+    try:
+        rendered_content = template_cache.get(template).render(variables)
+    except TemplateError as e:
+        return None, ({'error': str(e), 'missing': e.missing}, 400)
+    
+    # 获取目标平台
+    platform_name = data.get('platform')
+    platforms = get_target_platforms(user.id, platform_name)
+    if not platforms:
+        return None, ({'error': '没有找到可用的通知平台'}, 404)
+    
+    return SendRequest(user.id, platforms, rendered_content, platform_name, template), None
+
+def load_template(template_id, user_id):
+    """查询可用的模板（自己的或公共模板），返回 (template, None) 或 (None, (错误信息, 状态码))"""
+    template = MessageTemplate.query.get(template_id)
+    if not template:
+        return None, ({'error': '模板不存在'}, 404)
+    
+    # 检查权限
+    if template.user_id != user_id and not template.is_public:
+        return None, ({'error': '无权限使用此模板'}, 403)
+    return template, None
+
+def send_response(send_request, results):
+    """同步发送完成后的响应体"""
+    if send_request.template:
+        return {
+            'message': '模板消息发送完成',
+            'template': send_request.template.name,
+            'duplicates': count_duplicates(results),
+            'results': results
+        }
+    return {
+        'message': '通知发送完成',
+        'duplicates': count_duplicates(results),
+        'results': results
+    }
+
+def process_delivery_jobs(limit=10):
+    """领取并处理一批异步发送任务，返回处理的任务数"""
+    jobs = delivery_queue.claim(limit)
+    retry_jobs = []
+    for job in jobs:
+        try:
+            payload = json.loads(job.payload)
+            if payload.get('kind') == 'retry':
+                retry_jobs.append((job, payload))
+                continue
+            
+            platforms = get_target_platforms(job.user_id, payload.get('platform'))
+            if not platforms:
+                delivery_queue.complete(job, error='没有找到可用的通知平台')
+                continue
+            
+            message = payload['message']
+            if payload.get('variants'):
+                message = RenderedMessage.from_dict(message, payload['variants'])
+            deliver_message(
+                job.user_id,
+                platforms,
+                message,
+                template_id=payload.get('template_id'),
+                batch_id=job.batch_id
+            )
+            delivery_queue.complete(job)
+            invalidate_user_stats_cache(job.user_id)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"异步发送任务 {job.id} 处理失败: {e}")
+            delivery_queue.complete(job, error=str(e))
+    
+    if retry_jobs:
+        try:
+            process_retry_jobs(retry_jobs)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"重试任务处理失败: {e}")
+            for job, _ in retry_jobs:
+                delivery_queue.complete(job, error=str(e))
+    return len(jobs)
+
+def process_retry_jobs(jobs):
+    """并发重发一批重试任务并更新对应日志，重试耗尽的消息移入死信表"""
+    items = []
+    for job, payload in jobs:
+        log = db.session.get(NotificationLog, payload['log_id'])
+        platform = db.session.get(NotificationPlatform, log.platform_id) if log else None
+        if not log or not platform or not platform.is_active:
+            delivery_queue.complete(job, error='日志或平台已不存在')
+            continue
+        items.append((job, payload, log, platform))
+    
+    reserved = {index for index, (_, payload, _, _) in enumerate(items) if payload.get('reserved')}
+    messages = [(platform, retry_message(log, payload.get('variants'))) for _, payload, log, platform in items]
+    results = send_messages(messages, fresh=False, reserved=reserved)
+    
+    now = datetime.utcnow()
+    changes = []
+    for (job, payload, log, platform), result in zip(items, results):
+        attempt = payload['attempt']
+        variants = payload.get('variants')
+        if result is None:
+            result = {'success': False, 'status_code': 0, 'response': '不支持的平台类型'}
+        
+        old_status = log.status
+        log.response_code = result['status_code']
+        log.sent_at = now
+        if result['success']:
+            log.status = 'success'
+            log.error_message = None
+        elif result.get('deferred'):
+            log.error_message = result['response']
+            schedule_deferred(log, attempt, result['retry_after'], result['reserved'], variants=variants)
+        elif (is_retryable(result) or result.get('circuit_open')) and attempt < app.config['RETRY_MAX_ATTEMPTS']:
+            log.error_message = result['response']
+            schedule_retry(log, attempt + 1, retry_after=result.get('retry_after'), variants=variants)
+        else:
+            log.status = 'failed'
+            log.error_message = result['response']
+            deduplicator.release(log.user_id, log.platform_id, log.message)
+            db.session.add(DeadLetter(
+                user_id=log.user_id,
+                platform_id=log.platform_id,
+                log_id=log.id,
+                message=log.message,
+                template_id=log.template_id,
+                batch_id=log.batch_id,
+                attempts=attempt + 1,
+                last_status_code=result['status_code'],
+                last_error=result['response'],
+                variants=json.dumps(variants, ensure_ascii=False) if variants else None
+            ))
+        changes.append((log.user_id, old_status, log.status))
+        delivery_queue.complete(job, commit=False)
+    
+    stats_counters.record(changes)
+    db.session.commit()
+    for user_id in {log.user_id for _, _, log, _ in items}:
+        invalidate_user_stats_cache(user_id)
+
+def retry_message(log, variants=None):
+    """重发的消息内容：有平台变体时重建RenderedMessage，否则为日志中的文本"""
+    if variants:
+        return RenderedMessage.from_dict(log.message, variants)
+    return log.message
+
 # 路由
 @app.route('/')
 def index():
@@ -672,32 +1503,14 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # 尝试从缓存获取统计数据
-    cache_key = f"user_stats:{current_user.id}"
-    cached_stats = cache.get(cache_key)
-    
-    if cached_stats:
-        # 缓存命中，使用缓存的统计数据
-        stats = cached_stats
-        app.logger.info(f"Dashboard stats cache hit for user {current_user.id}")
-    else:
-        # 缓存未命中，从数据库查询
-        platforms = NotificationPlatform.query.filter_by(user_id=current_user.id).all()
-        total_platforms = len(platforms)
-        success_count = NotificationLog.query.filter_by(user_id=current_user.id, status='success').count()
-        failed_count = NotificationLog.query.filter_by(user_id=current_user.id, status='failed').count()
-        total_count = success_count + failed_count
-        
-        stats = {
-            'total_platforms': total_platforms,
-            'success_count': success_count,
-            'failed_count': failed_count,
-            'total_count': total_count
-        }
-        
-        # 缓存统计数据（缓存5分钟）
-        cache.set(cache_key, stats, expire=300)
-        app.logger.info(f"Dashboard stats cached for user {current_user.id}")
+    # 统计数据缓存5分钟，过期时只有一个请求重新查询，其他请求使用旧数据
+    user_id = current_user.id
+    stats = cache.get_or_compute(
+        f"user_stats:{user_id}",
+        lambda: load_user_stats(user_id),
+        expire=300,
+        tags=(user_cache_tag(user_id),)
+    )
     
     # 最近日志不缓存，保持实时性
     recent_logs = NotificationLog.query.filter_by(user_id=current_user.id).order_by(NotificationLog.sent_at.desc()).limit(10).all()
@@ -710,6 +1523,19 @@ def dashboard():
     
     return render_template('dashboard.html', platforms=platforms, logs=recent_logs, stats=stats)
 
+def load_user_stats(user_id):
+    """仪表板统计数据（发送计数读取user_stats表的一行，不扫描日志）"""
+    total_platforms = NotificationPlatform.query.filter_by(user_id=user_id).count()
+    counts = stats_counters.get(user_id)
+    success_count = counts['success']
+    failed_count = counts['failed']
+    return {
+        'total_platforms': total_platforms,
+        'success_count': success_count,
+        'failed_count': failed_count,
+        'total_count': success_count + failed_count
+    }
+
 def invalidate_user_stats_cache(user_id):
     """使用户统计缓存失效"""
     cache_key = f"user_stats:{user_id}"
@@ -727,6 +1553,7 @@ def generate_api_token():
     try:
         token = current_user.generate_api_token()
         db.session.commit()
+        invalidate_user_cache(current_user.id)
         return jsonify({
             'success': True, 
             'token': token,
@@ -742,10 +1569,19 @@ def revoke_api_token():
         current_user.api_token = None
         current_user.token_expires_at = None
         db.session.commit()
+        invalidate_user_cache(current_user.id)
         return jsonify({'success': True, 'message': 'API Token已撤销'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def parse_positive_int(value):
+    """解析表单中的可选正整数，留空或非正数返回None"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
 @app.route('/platforms')
 @login_required
 def platforms():
@@ -764,10 +1600,13 @@ def add_platform():
             user_id=current_user.id,
             name=name,
             platform_type=platform_type,
-            webhook_url=webhook_url
+            webhook_url=webhook_url,
+            rate_limit_per_minute=parse_positive_int(request.form.get('rate_limit_per_minute')),
+            coalesce_window=parse_positive_int(request.form.get('coalesce_window'))
         )
         db.session.add(platform)
         db.session.commit()
+        invalidate_routing_table(current_user.id)
         
         flash('平台添加成功！')
         return redirect(url_for('platforms'))
@@ -784,8 +1623,12 @@ def edit_platform(platform_id):
         platform.platform_type = request.form['platform_type']
         platform.webhook_url = request.form['webhook_url']
         platform.is_active = 'is_active' in request.form
+        platform.rate_limit_per_minute = parse_positive_int(request.form.get('rate_limit_per_minute'))
+        platform.coalesce_window = parse_positive_int(request.form.get('coalesce_window'))
         
         db.session.commit()
+        bot_registry.invalidate(platform.id)
+        invalidate_routing_table(current_user.id)
         flash('平台更新成功！')
         return redirect(url_for('platforms'))
     
@@ -797,6 +1640,8 @@ def delete_platform(platform_id):
     platform = NotificationPlatform.query.filter_by(id=platform_id, user_id=current_user.id).first_or_404()
     db.session.delete(platform)
     db.session.commit()
+    bot_registry.invalidate(platform_id)
+    invalidate_routing_table(current_user.id)
     flash('平台删除成功！')
     return redirect(url_for('platforms'))
 
@@ -807,17 +1652,10 @@ def test_platform(platform_id):
     
     test_message = "这是一条测试消息 🧍‍♂️"
     
-    if platform.platform_type == 'feishu':
-        bot = FeishuBot(platform.webhook_url)
-        result = bot.send_message(test_message)
-    elif platform.platform_type == 'flomo':
-        bot = FlomoBot(platform.webhook_url)
-        result = bot.send_message(test_message)
-    elif platform.platform_type == 'dingtalk':
-        bot = DingTalkBot(platform.webhook_url)
-        result = bot.send_message(test_message)
-    else:
+    bot = bot_registry.get(platform)
+    if bot is None:
         return jsonify({'error': '不支持的平台类型'})
+    result = bot.send_message(test_message)
     
     # 记录日志
     log = NotificationLog(
@@ -829,7 +1667,9 @@ def test_platform(platform_id):
         error_message=result['response'] if not result['success'] else None
     )
     db.session.add(log)
+    stats_counters.record([(current_user.id, None, log.status)])
     db.session.commit()
+    invalidate_user_stats_cache(current_user.id)
     
     return jsonify(result)
 
@@ -839,80 +1679,114 @@ def api_send():
     data = request.get_json()
     
     # 支持Header和Body两种认证方式
-    token = None
-    auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header[7:]  # 移除 "Bearer " 前缀
-    elif data and 'token' in data:
-        token = data['token']
+    send_request, error = resolve_send_request(data, get_api_token(data))
+    if error:
+        return jsonify(error[0]), error[1]
     
-    if not data or 'message' not in data:
-        return jsonify({'error': '缺少必要参数'}), 400
+    # 异步模式：持久化任务后立即返回202，由Worker投递
+    if use_async_delivery(data):
+        return enqueue_delivery(send_request)
     
-    if not token:
-        return jsonify({'error': '缺少认证Token'}), 401
+    results = deliver_message(send_request.user_id, send_request.platforms, send_request.message)
+    db.session.commit()
     
-    # 使用缓存验证Token
-    user = verify_token_with_cache(token)
-    if not user:
-        return jsonify({'error': '无效的token'}), 401
+    # 发送完成后，使用户统计缓存失效
+    invalidate_user_stats_cache(send_request.user_id)
     
-    message = data['message']
-    platform_name = data.get('platform', None)
+    return jsonify(send_response(send_request, results))
+
+@app.route('/api/send_batch', methods=['POST'])
+def api_send_batch():
+    """批量发送：一次请求发送多条消息，每条可单独指定平台"""
+    data = request.get_json(silent=True)
     
-    # 获取用户的平台
-    if platform_name:
-        platforms = NotificationPlatform.query.filter_by(
-            user_id=user.id, 
-            name=platform_name, 
-            is_active=True
-        ).all()
-    else:
-        platforms = NotificationPlatform.query.filter_by(
-            user_id=user.id, 
-            is_active=True
-        ).all()
+    if not data or not isinstance(data.get('messages'), list) or not data['messages']:
+        return jsonify({'error': '缺少消息数据'}), 400
+    
+    messages = data['messages']
+    if len(messages) > app.config['BATCH_MAX_MESSAGES']:
+        return jsonify({'error': f"单次最多发送 {app.config['BATCH_MAX_MESSAGES']} 条消息"}), 400
     
+    # Token与平台只解析一次，整批共用
+    user, error = authenticate_token(get_api_token(data))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    platforms = get_target_platforms(user.id)
     if not platforms:
         return jsonify({'error': '没有找到可用的通知平台'}), 404
     
-    results = []
+    platforms_by_name = {}
     for platform in platforms:
-        if platform.platform_type == 'feishu':
-            bot = FeishuBot(platform.webhook_url)
-        elif platform.platform_type == 'flomo':
-            bot = FlomoBot(platform.webhook_url)
-        elif platform.platform_type == 'dingtalk':
-            bot = DingTalkBot(platform.webhook_url)
-        else:
+        platforms_by_name.setdefault(platform.name, []).append(platform)
+    
+    batch_id = delivery_queue.new_batch_id()
+    results = []
+    tasks = []  # (结果序号, platform, message)
+    for index, item in enumerate(messages):
+        message = item.get('message') if isinstance(item, dict) else None
+        if not message or not isinstance(message, str):
+            results.append({'index': index, 'success': False, 'error': '缺少消息内容'})
             continue
         
-        result = bot.send_message(message)
-        
-        # 记录日志
-        log = NotificationLog(
-            user_id=user.id,
-            platform_id=platform.id,
-            message=message,
-            status='success' if result['success'] else 'failed',
-            response_code=result['status_code'],
-            error_message=result['response'] if not result['success'] else None
-        )
-        db.session.add(log)
+        platform_name = item.get('platform')
+        targets = platforms_by_name.get(platform_name, []) if platform_name else platforms
+        if not targets:
+            results.append({'index': index, 'success': False, 'error': f'平台不存在: {platform_name}'})
+            continue
         
-        results.append({
-            'platform': platform.name,
-            'success': result['success'],
-            'status_code': result['status_code']
-        })
-    
+        results.append({'index': index, 'success': False, 'results': []})
+        tasks.extend((len(results) - 1, platform, message) for platform in targets)
+    
+    if not tasks:
+        return jsonify({'error': '没有可发送的消息', 'results': results}), 400
+    
+    # 异步模式：每条消息一个任务，共用batch_id
+    if use_async_delivery(data):
+        for item in results:
+            if 'results' in item:
+                delivery_queue.enqueue(user.id, {
+                    'message': messages[item['index']]['message'],
+                    'platform': messages[item['index']].get('platform')
+                }, batch_id=batch_id)
+                item.update({'success': True, 'queued': True})
+                del item['results']
+        db.session.commit()
+        return jsonify({
+            'message': '批量消息已加入发送队列',
+            'batch_id': batch_id,
+            'total': len(messages),
+            'results': results
+        }), 202
+    
+    sent = send_messages([(platform, message) for _, platform, message in tasks])
+    
+    delivered = []
+    for (position, platform, message), result in zip(tasks, sent):
+        if result is None:
+            continue  # 不支持的平台类型
+        delivered.append((platform, message, result))
+        results[position]['results'].append(summarize_result(platform, result))
+    
+    for item in results:
+        if 'results' in item:
+            # 被去重忽略和限流延迟发送的平台不计为失败
+            item['success'] = bool(item['results']) and all(
+                r.get('duplicate') or r.get('deferred') or r['success'] for r in item['results'])
+    
+    # 整批日志一次性批量插入
+    record_results(user.id, delivered, batch_id=batch_id)
     db.session.commit()
-    
-    # 发送完成后，使用户统计缓存失效
     invalidate_user_stats_cache(user.id)
     
+    success_count = len([item for item in results if item['success']])
     return jsonify({
-        'message': '通知发送完成',
+        'message': '批量发送完成',
+        'batch_id': batch_id,
+        'total': len(messages),
+        'success_count': success_count,
+        'failed_count': len(messages) - success_count,
+        'duplicates': sum(count_duplicates(item.get('results', [])) for item in results),
         'results': results
     })
 
@@ -969,6 +1843,7 @@ def delete_template(template_id):
     template = MessageTemplate.query.filter_by(id=template_id, user_id=current_user.id).first_or_404()
     db.session.delete(template)
     db.session.commit()
+    template_cache.invalidate(template_id)
     flash('模板删除成功！')
     return redirect(url_for('templates'))
 
@@ -977,98 +1852,122 @@ def api_send_template():
     data = request.get_json()
     
     # 支持Header和Body两种认证方式
-    token = None
-    auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header[7:]  # 移除 "Bearer " 前缀
-    elif data and 'token' in data:
-        token = data['token']
+    send_request, error = resolve_template_request(data, get_api_token(data))
+    if error:
+        return jsonify(error[0]), error[1]
     
-    if not data or 'template_id' not in data:
-        return jsonify({'error': '缺少必要参数'}), 400
+    # 更新模板使用次数
+    send_request.template.usage_count += 1
     
-    if not token:
-        return jsonify({'error': '缺少认证Token'}), 401
+    if use_async_delivery(data):
+        return enqueue_delivery(send_request)
     
-    # 使用缓存验证Token
-    user = verify_token_with_cache(token)
-    if not user:
-        return jsonify({'error': '无效的token'}), 401
+    results = deliver_message(send_request.user_id, send_request.platforms, send_request.message,
+                              template_id=send_request.template.id)
+    db.session.commit()
     
-    template = MessageTemplate.query.get(data['template_id'])
-    if not template:
-        return jsonify({'error': '模板不存在'}), 404
+    return jsonify(send_response(send_request, results))
+
+@app.route('/api/send_template_batch', methods=['POST'])
+def api_send_template_batch():
+    """批量模板发送：同一模板配合多组变量（每个客户/主机一组）
+
+    JSON请求体: {"template_id": 1, "platform": "可选", "recipients": [{变量}, ...]}
+    NDJSON请求体（Content-Type: application/x-ndjson）: 每行一组变量，template_id和platform放在查询参数中
+    """
+    if request.mimetype == 'application/x-ndjson':
+        data = None
+        params = request.args
+        variable_sets = iter_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('recipients'), list):
+            return jsonify({'error': '缺少变量数据'}), 400
+        params = data
+        variable_sets = data['recipients']
     
-    # 检查权限
-    if template.user_id != user.id and not template.is_public:
-        return jsonify({'error': '无权限使用此模板'}), 403
+    if not params.get('template_id'):
+        return jsonify({'error': '缺少必要参数'}), 400
     
-    # 渲染模板内容
-    variables = data.get('variables', {})
-    try:
-        rendered_content = template.content
-        for key, value in variables.items():
-            rendered_content = rendered_content.replace(f'{{{{{key}}}}}', str(value))
-    except Exception as e:
-        return jsonify({'error': f'模板渲染失败: {str(e)}'}), 400
+    user, error = authenticate_token(get_api_token(data))
+    if error:
+        return jsonify(error[0]), error[1]
     
-    # 获取目标平台
-    platform_name = data.get('platform')
-    if platform_name:
-        platforms = NotificationPlatform.query.filter_by(
-            user_id=user.id, 
-            name=platform_name, 
-            is_active=True
-        ).all()
-    else:
-        platforms = NotificationPlatform.query.filter_by(
-            user_id=user.id, 
-            is_active=True
-        ).all()
+    template, error = load_template(params.get('template_id'), user.id)
+    if error:
+        return jsonify(error[0]), error[1]
     
+    platform_name = params.get('platform')
+    platforms = get_target_platforms(user.id, platform_name)
     if not platforms:
         return jsonify({'error': '没有找到可用的通知平台'}), 404
     
-    results = []
-    for platform in platforms:
-        if platform.platform_type == 'feishu':
-            bot = FeishuBot(platform.webhook_url)
-        elif platform.platform_type == 'flomo':
-            bot = FlomoBot(platform.webhook_url)
-        elif platform.platform_type == 'dingtalk':
-            bot = DingTalkBot(platform.webhook_url)
-        else:
-            continue
-        
-        result = bot.send_message(rendered_content)
-        
-        # 记录日志
-        log = NotificationLog(
-            user_id=user.id,
-            platform_id=platform.id,
-            template_id=template.id,
-            message=rendered_content,
-            status='success' if result['success'] else 'failed',
-            response_code=result['status_code'],
-            error_message=result['response'] if not result['success'] else None
+    template_id = template.id
+    template_name = template.name
+    compiled = template_cache.get(template)
+    batch_id = delivery_queue.new_batch_id()
+    summary = MergeSummary()
+    max_items = app.config['MAIL_MERGE_MAX_ITEMS']
+    
+    # 读取 -> 渲染 -> 分块发送，每块发送完成后写入日志并提交
+    variable_sets = iter(variable_sets)
+    rendered = render_each(compiled, islice(variable_sets, max_items), TemplateError)
+    for chunk in chunked(rendered, app.config['MAIL_MERGE_CHUNK_SIZE']):
+        deliver_merge_chunk(user.id, platforms, chunk, template_id, batch_id, summary)
+    summary.truncated = next(variable_sets, MergeSummary) is not MergeSummary
+    
+    # 使用次数整批更新一次
+    if summary.rendered:
+        MessageTemplate.query.filter_by(id=template_id).update(
+            {MessageTemplate.usage_count: db.func.coalesce(MessageTemplate.usage_count, 0) + summary.rendered},
+            synchronize_session=False
         )
-        db.session.add(log)
-        
-        results.append({
-            'platform': platform.name,
-            'success': result['success'],
-            'status_code': result['status_code']
-        })
+        db.session.commit()
+        invalidate_user_stats_cache(user.id)
     
-    # 更新模板使用次数
-    template.usage_count += 1
-    db.session.commit()
+    response = summary.to_dict()
+    response.update(message='批量模板消息发送完成', template=template_name, batch_id=batch_id)
+    if summary.truncated:
+        response['message'] = f'单次最多发送 {max_items} 组变量，超出部分未发送'
+    return jsonify(response)
+
+def deliver_merge_chunk(user_id, platforms, chunk, template_id, batch_id, summary):
+    """发送一块渲染结果并写入日志（提交事务），统计结果计入summary"""
+    summary.total += len(chunk)
+    items = []
+    owners = []  # 与items对应的序号
+    for index, message, error in chunk:
+        if error:
+            summary.add_error(index, error)
+            continue
+        summary.rendered += 1
+        for platform in platforms:
+            items.append((platform, message))
+            owners.append(index)
+    if not items:
+        return
+    
+    sent = send_messages(items)
+    delivered = []
+    outcome = {}  # 序号 -> 是否全部平台发送成功
+    for (platform, message), index, result in zip(items, owners, sent):
+        if result is None:
+            continue  # 不支持的平台类型
+        delivered.append((platform, message, result))
+        if result.get('duplicate'):
+            summary.duplicates += 1  # 原消息已发送或正在发送，不计为失败
+            outcome.setdefault(index, True)
+        else:
+            outcome[index] = outcome.get(index, True) and (result['success'] or result.get('deferred'))
     
-    return jsonify({
-        'message': '模板消息发送完成',
-        'template': template.name,
-        'results': results
-    })
+    for index in dict.fromkeys(owners):
+        if outcome.get(index):
+            summary.success_count += 1
+        else:
+            summary.add_error(index, '发送失败')
+    
+    record_results(user_id, delivered, template_id=template_id, batch_id=batch_id)
+    db.session.commit()
 
 # 获取模板详情API
 @app.route('/api/template/<int:template_id>')
@@ -1148,14 +2047,258 @@ def api_recent_logs():
         } for log in logs]
     })
 
+# /api/logs 可返回的字段，id和sent_at始终返回（用于游标）
+LOG_FIELDS = ('id', 'platform_id', 'template_id', 'batch_id', 'digest_id', 'status', 'response_code',
+              'error_message', 'message', 'sent_at')
+LOG_DEFAULT_FIELDS = ('id', 'platform_id', 'template_id', 'batch_id', 'digest_id', 'status', 'response_code', 'sent_at')
+LOG_PAGE_MAX = 500
+
+@app.route('/api/logs')
+@require_api_token
+def api_logs(user):
+    """按条件查询发送日志，按 (sent_at, id) 游标分页
+
+    过滤: status（逗号分隔多个）、platform（平台名称）、platform_id、template_id、batch_id、
+    since/until（ISO时间，UTC，含since不含until）
+    分页: limit（默认50，最多500）、order（desc默认/asc）、cursor（上一页返回的next_cursor）
+    fields: 逗号分隔的返回字段，默认不含message和error_message
+    """
+    args = request.args
+    limit = min(max(args.get('limit', 50, type=int), 1), LOG_PAGE_MAX)
+    descending = args.get('order', 'desc') != 'asc'
+    
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in LOG_FIELDS]
+        if unknown:
+            return jsonify({'error': f"不支持的字段: {', '.join(unknown)}"}), 400
+        fields = list(dict.fromkeys(['id', *fields, 'sent_at']))
+    else:
+        fields = list(LOG_DEFAULT_FIELDS)
+    
+    try:
+        since = datetime.fromisoformat(args['since']) if args.get('since') else None
+        until = datetime.fromisoformat(args['until']) if args.get('until') else None
+    except ValueError:
+        return jsonify({'error': '时间格式应为ISO 8601，如2026-01-15或2026-01-15T08:00:00'}), 400
+    try:
+        cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    columns = NotificationLog.__table__.c
+    query = NotificationLog.query.with_entities(*(columns[field] for field in fields))\
+                                 .filter(NotificationLog.user_id == user.id, NotificationLog.sent_at.isnot(None))
+    if args.get('status'):
+        query = query.filter(NotificationLog.status.in_(args['status'].split(',')))
+    for name in ('platform_id', 'template_id'):
+        if args.get(name):
+            value = args.get(name, type=int)
+            if value is None:
+                return jsonify({'error': f'{name}必须是整数'}), 400
+            query = query.filter(columns[name] == value)
+    if args.get('platform'):
+        platform_ids = [platform.id for platform in NotificationPlatform.query.with_entities(NotificationPlatform.id)
+                        .filter_by(user_id=user.id, name=args['platform'])]
+        query = query.filter(NotificationLog.platform_id.in_(platform_ids))
+    if args.get('batch_id'):
+        query = query.filter(NotificationLog.batch_id == args['batch_id'])
+    if since:
+        query = query.filter(NotificationLog.sent_at >= since)
+    if until:
+        query = query.filter(NotificationLog.sent_at < until)
+    if cursor:
+        query = query.filter(keyset_after(NotificationLog.sent_at, NotificationLog.id, cursor, descending))
+    
+    if descending:
+        query = query.order_by(NotificationLog.sent_at.desc(), NotificationLog.id.desc())
+    else:
+        query = query.order_by(NotificationLog.sent_at, NotificationLog.id)
+    # 多取一行判断是否还有下一页
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    logs = []
+    for row in rows:
+        log = dict(row._mapping)
+        log['sent_at'] = log['sent_at'].isoformat()
+        logs.append(log)
+    
+    return jsonify({
+        'logs': logs,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1].sent_at, rows[-1].id) if has_more else None
+    })
+
+@app.route('/api/batch_status/<batch_id>')
+@require_api_token
+def api_batch_status(user, batch_id):
+    """查询异步发送任务的状态"""
+    jobs = DeliveryJob.query.filter_by(user_id=user.id, batch_id=batch_id).all()
+    logs = NotificationLog.query.filter_by(user_id=user.id, batch_id=batch_id).all()
+    
+    if not jobs and not logs:
+        return jsonify({'error': '批次不存在'}), 404
+    
+    return jsonify({
+        'batch_id': batch_id,
+        'jobs': [{
+            'id': job.id,
+            'status': job.status,
+            'attempts': job.attempts,
+            'error': job.error_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        } for job in jobs],
+        'total': len(logs),
+        'success': len([log for log in logs if log.status == 'success']),
+        'failed': len([log for log in logs if log.status == 'failed']),
+        'results': [{
+            'id': log.id,
+            'platform_id': log.platform_id,
+            'status': log.status,
+            'status_code': log.response_code,
+            'sent_at': log.sent_at.isoformat() if log.sent_at else None
+        } for log in logs]
+    })
+
+@app.route('/api/logs/archive')
+@require_api_token
+def api_log_archive(user):
+    """流式返回已归档的发送日志（NDJSON，审计用）：?from=YYYY-MM-DD&to=YYYY-MM-DD"""
+    try:
+        start = date.fromisoformat(request.args.get('from', ''))
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else start
+    except ValueError:
+        return jsonify({'error': '日期格式应为YYYY-MM-DD'}), 400
+    if end < start or (end - start).days > 366:
+        return jsonify({'error': '日期范围无效（最长366天）'}), 400
+    
+    user_id = user.id
+    
+    def generate():
+        for day in log_archive.partitions(start, end):
+            for row in log_archive.iter_rows(day, user_id):
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/dead_letters')
+@require_api_token
+def api_dead_letters(user):
+    """查看死信（重试耗尽仍失败的消息）"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    letters = DeadLetter.query.filter_by(user_id=user.id, replayed_at=None)\
+                              .order_by(DeadLetter.id.desc())\
+                              .limit(limit).all()
+    return jsonify({
+        'dead_letters': [{
+            'id': letter.id,
+            'platform_id': letter.platform_id,
+            'log_id': letter.log_id,
+            'message': letter.message,
+            'batch_id': letter.batch_id,
+            'attempts': letter.attempts,
+            'last_status_code': letter.last_status_code,
+            'last_error': letter.last_error,
+            'created_at': letter.created_at.isoformat()
+        } for letter in letters]
+    })
+
+@app.route('/api/dead_letters/replay', methods=['POST'])
+@require_api_token
+def api_replay_dead_letters(user):
+    """批量重放死信：body为 {"ids": [...]} 或 {"all": true}"""
+    data = request.get_json(silent=True) or {}
+    query = DeadLetter.query.filter_by(user_id=user.id, replayed_at=None)
+    if not data.get('all'):
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'error': '缺少要重放的死信ID'}), 400
+        query = query.filter(DeadLetter.id.in_(ids))
+    
+    letters = query.order_by(DeadLetter.id).limit(app.config['BATCH_MAX_MESSAGES']).all()
+    now = datetime.utcnow()
+    changes = []
+    for letter in letters:
+        log = db.session.get(NotificationLog, letter.log_id) if letter.log_id else None
+        if log is None:
+            log = NotificationLog(
+                user_id=letter.user_id,
+                platform_id=letter.platform_id,
+                template_id=letter.template_id,
+                batch_id=letter.batch_id,
+                message=letter.message,
+                status='pending'
+            )
+            db.session.add(log)
+            db.session.flush()
+        changes.append((log.user_id, log.status, 'pending'))
+        log.status = 'pending'
+        schedule_retry(log, 1, variants=json.loads(letter.variants) if letter.variants else None)
+        letter.replayed_at = now
+    
+    stats_counters.record(changes)
+    db.session.commit()
+    invalidate_user_stats_cache(user.id)
+    return jsonify({'success': True, 'replayed': len(letters)})
+
+@app.route('/api/system/breakers')
+@login_required
+def api_breaker_states():
+    """当前用户各平台的熔断器状态"""
+    platforms = NotificationPlatform.query.filter_by(user_id=current_user.id).all()
+    return jsonify({
+        'breakers': [dict(
+            platform_id=platform.id,
+            platform=platform.name,
+            host=urllib.parse.urlparse(platform.webhook_url).hostname,
+            **breakers.snapshot(platform.id)
+        ) for platform in platforms]
+    })
+
+@app.route('/api/system/cache')
+@login_required
+def api_cache_stats():
+    """两级缓存命中统计"""
+    stats = cache.stats()
+    stats['templates'] = template_cache.stats()
+    return jsonify(stats)
+
+@app.route('/api/system/transport')
+@login_required
+def api_transport_stats():
+    """HTTP及SMTP连接池、机器人实例缓存统计"""
+    stats = http_transport.stats()
+    stats['smtp'] = smtp_pool.stats()
+    stats['bots'] = bot_registry.stats()
+    return jsonify(stats)
+
+@app.route('/api/system/log_writer')
+@login_required
+def api_log_writer_stats():
+    """发送日志后台写入队列深度及批量提交统计"""
+    stats = log_writer.stats()
+    stats['mode'] = app.config['LOG_WRITE_MODE']
+    return jsonify(stats)
+
 if __name__ == '__main__':
     # 设置日志
     setup_logging(app)
     
     with app.app_context():
-        db.create_all()
+        upgrade_schema(db)
         app.logger.info("数据库初始化完成！")
     
+    # 进程内异步发送Worker（独立部署时使用 python worker.py）
+    if app.config['DELIVERY_EMBEDDED_WORKERS']:
+        start_embedded_workers(
+            app, process_delivery_jobs, app.config['DELIVERY_EMBEDDED_WORKERS'],
+            batch_size=app.config['DELIVERY_BATCH_SIZE'],
+            poll_interval=app.config['DELIVERY_POLL_INTERVAL']
+        )
+    
     app.logger.info("🧍‍♂️ 通知管理系统启动中...")
     app.logger.info(f"访问地址: http://localhost:5555")
     app.logger.info("按 Ctrl+C 停止服务")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+ASGI入口
+/api/send 和 /api/send_template 由asyncio处理：Webhook请求通过异步HTTP客户端发送，
+单个进程即可同时保持大量在途请求，不需要为每个请求占用一个线程。
+其余页面和API仍交给Flask应用处理，模型、认证和发送日志与WSGI部署完全一致。
+
+用法:
+    uvicorn asgi:application --host 0.0.0.0 --port 5555 --workers 4
+"""
+import asyncio
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app, db, process_delivery_jobs, invalidate_user_stats_cache,
+    resolve_send_request, resolve_template_request, use_async_delivery, enqueue_send_job,
+    snapshot_platform, send_messages_async, record_results, summarize_result, count_duplicates, log_writer
+)
+from delivery_queue import start_embedded_workers
+from migrations import upgrade
+from transport import AsyncHTTPTransport
+
+ASYNC_ROUTES = {
+    '/api/send': resolve_send_request,
+    '/api/send_template': resolve_template_request,
+}
+
+
+class SendApplication:
+    """异步发送入口，非发送请求转发给Flask（WSGI）应用"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.transport = None
+        self.limit = None
+        self.stop_workers = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in ASYNC_ROUTES:
+            await self.handle_send(scope, receive, send)
+            return
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(self.startup)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def startup(self):
+        with self.flask_app.app_context():
+            upgrade(db)
+        if self.flask_app.config['DELIVERY_EMBEDDED_WORKERS']:
+            self.stop_workers = start_embedded_workers(
+                self.flask_app, process_delivery_jobs, self.flask_app.config['DELIVERY_EMBEDDED_WORKERS'],
+                batch_size=self.flask_app.config['DELIVERY_BATCH_SIZE'],
+                poll_interval=self.flask_app.config['DELIVERY_POLL_INTERVAL']
+            )
+
+    async def shutdown(self):
+        if self.stop_workers is not None:
+            self.stop_workers.set()
+        # 写完后台队列中的发送日志
+        await asyncio.to_thread(log_writer.stop)
+        if self.transport is not None:
+            await self.transport.close()
+            self.transport = None
+
+    def ensure_transport(self):
+        # 在事件循环内创建，服务器不支持lifespan时首个请求创建
+        if self.transport is None:
+            config = self.flask_app.config
+            self.transport = AsyncHTTPTransport(
+                connect_timeout=config['HTTP_CONNECT_TIMEOUT'],
+                read_timeout=config['HTTP_READ_TIMEOUT'],
+                max_connections=config['ASGI_MAX_IN_FLIGHT'],
+                max_keepalive_connections=config['ASGI_MAX_KEEPALIVE'],
+                max_response_bytes=config['HTTP_MAX_RESPONSE_BYTES']
+            )
+            self.limit = asyncio.Semaphore(config['ASGI_MAX_IN_FLIGHT'])
+
+    async def handle_send(self, scope, receive, send):
+        body = await read_body(receive)
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            await send_json(send, 400, {'error': '请求体不是有效的JSON'})
+            return
+
+        if not isinstance(data, dict):
+            data = None
+
+        token = get_bearer_token(scope, data)
+        resolve = ASYNC_ROUTES[scope['path']]
+        status, payload, prepared = await asyncio.to_thread(self.prepare, resolve, data, token)
+        if prepared is None:
+            await send_json(send, status, payload)
+            return
+
+        self.ensure_transport()
+        user_id, platforms, message, template_id = prepared
+        results = await send_messages_async(
+            [(platform, message) for platform in platforms], self.transport, self.limit
+        )
+        sent = [(platform, message, result) for platform, result in zip(platforms, results) if result is not None]
+        await asyncio.to_thread(self.record, user_id, sent, template_id)
+
+        summaries = [summarize_result(platform, result) for platform, _, result in sent]
+        payload['duplicates'] = count_duplicates(summaries)
+        payload['results'] = summaries
+        await send_json(send, 200, payload)
+
+    def prepare(self, resolve, data, token):
+        """（线程池中执行）认证、查询平台、渲染模板
+
+        返回 (状态码, 响应体, 待发送内容)；不需要在事件循环中发送时待发送内容为None
+        """
+        with self.flask_app.app_context():
+            send_request, error = resolve(data, token)
+            if error:
+                return error[1], error[0], None
+
+            template = send_request.template
+            if template:
+                template.usage_count += 1
+
+            if use_async_delivery(data):
+                return 202, enqueue_send_job(send_request), None
+
+            platforms = [snapshot_platform(platform) for platform in send_request.platforms]
+            if template:
+                payload = {'message': '模板消息发送完成', 'template': template.name}
+                template_id = template.id
+                db.session.commit()
+            else:
+                payload = {'message': '通知发送完成'}
+                template_id = None
+            return 200, payload, (send_request.user_id, platforms, send_request.message, template_id)
+
+    def record(self, user_id, sent, template_id):
+        """（线程池中执行）写发送日志"""
+        with self.flask_app.app_context():
+            record_results(user_id, sent, template_id=template_id)
+            db.session.commit()
+            invalidate_user_stats_cache(user_id)
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def get_bearer_token(scope, data):
+    """从Authorization Header或请求体中获取API Token"""
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            value = value.decode('latin-1')
+            if value.startswith('Bearer '):
+                return value[7:]
+    if isinstance(data, dict) and 'token' in data:
+        return data['token']
+    return None
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+application = SendApplication(app)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('asgi:application', host='0.0.0.0', port=5555)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+同步发送与asyncio发送的扇出对比
+
+本地起一个固定延迟的模拟Webhook服务，分别用 send_messages（线程池调度）和
+send_messages_async（asgi.py使用的异步路径）向N个Webhook平台各发送一条消息。
+
+用法（在notification_manager目录下）:
+    python benchmarks/bench_async_send.py --platforms 500 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('BREAKER_ENABLED', 'false')
+
+RESPONSE = (b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+            b'Content-Length: 11\r\nConnection: keep-alive\r\n\r\n{"code": 0}')
+
+
+def start_mock_server(latency):
+    """在后台线程的事件循环中运行一个keep-alive的模拟Webhook服务，返回端口"""
+    ready = threading.Event()
+    state = {}
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                headers = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in headers.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                await reader.readexactly(length)
+                await asyncio.sleep(latency)
+                writer.write(RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0, backlog=4096)
+        state['port'] = server.sockets[0].getsockname()[1]
+        ready.set()
+        await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    return state['port']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步/异步发送扇出对比')
+    parser.add_argument('--platforms', type=int, default=500, help='Webhook平台数')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟Webhook响应延迟（秒）')
+    args = parser.parse_args()
+
+    from app import app, PlatformSnapshot, send_messages, send_messages_async
+    from transport import AsyncHTTPTransport
+
+    port = start_mock_server(args.latency)
+    platforms = [
+        PlatformSnapshot(
+            id=index, user_id=1, name=f'bench-{index}', platform_type='webhook',
+            webhook_url=f'http://127.0.0.1:{port}/hook/{index}',
+            rate_limit_per_minute=None, coalesce_window=None
+        )
+        for index in range(args.platforms)
+    ]
+    items = [(platform, 'benchmark') for platform in platforms]
+
+    started = time.perf_counter()
+    results = send_messages(items, fresh=False)
+    sync_elapsed = time.perf_counter() - started
+    sync_ok = sum(1 for result in results if result and result['success'])
+
+    async def run_async():
+        transport = AsyncHTTPTransport(
+            max_connections=app.config['ASGI_MAX_IN_FLIGHT'],
+            max_keepalive_connections=app.config['ASGI_MAX_KEEPALIVE']
+        )
+        limit = asyncio.Semaphore(app.config['ASGI_MAX_IN_FLIGHT'])
+        try:
+            started = time.perf_counter()
+            results = await send_messages_async(items, transport, limit, fresh=False)
+            return time.perf_counter() - started, results
+        finally:
+            await transport.close()
+
+    async_elapsed, results = asyncio.run(run_async())
+    async_ok = sum(1 for result in results if result and result['success'])
+
+    print(f"平台数: {args.platforms}  Webhook延迟: {args.latency}s")
+    print(f"同步 (DISPATCH_MAX_IN_FLIGHT={app.config['DISPATCH_MAX_IN_FLIGHT']}): "
+          f"{sync_elapsed:.2f}s  成功 {sync_ok}/{args.platforms}")
+    print(f"异步 (ASGI_MAX_IN_FLIGHT={app.config['ASGI_MAX_IN_FLIGHT']}): "
+          f"{async_elapsed:.2f}s  成功 {async_ok}/{args.platforms}")
+    if async_elapsed:
+        print(f"加速比: {sync_elapsed / async_elapsed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
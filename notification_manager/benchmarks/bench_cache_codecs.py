@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+缓存编码对比：旧方案（pickle整个User对象 + latin1字符串）与新编码的大小和编解码耗时
+
+用法（在notification_manager目录下）:
+    python benchmarks/bench_cache_codecs.py --rounds 20000
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+
+def measure(label, encode, decode, value, rounds):
+    data = encode(value)
+    encode_us = timeit.timeit(lambda: encode(value), number=rounds) / rounds * 1e6
+    decode_us = timeit.timeit(lambda: decode(data), number=rounds) / rounds * 1e6
+    print(f"{label:<32} {len(data):>6} B  编码 {encode_us:>7.2f} µs  解码 {decode_us:>7.2f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='缓存编码对比')
+    parser.add_argument('--rounds', type=int, default=20000)
+    args = parser.parse_args()
+
+    from app import app, db, User
+    from cache_codecs import VersionedCodec, JSONCodec, MsgpackCodec, msgpack_available
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password_hash='x' * 102)
+        user.generate_api_token()
+        db.session.add(user)
+        db.session.commit()
+        user = db.session.get(User, user.id)
+
+        expires_at = (user.token_expires_at - datetime(1970, 1, 1)).total_seconds()
+        claims = {'id': user.id, 'active': user.is_active, 'exp': expires_at}
+        stats = {'total_platforms': 12, 'success_count': 48213, 'failed_count': 311, 'total_count': 48524}
+
+        measure('pickle(User) + latin1 [旧]',
+                lambda value: pickle.dumps(value).decode('latin1'),
+                lambda data: pickle.loads(data.encode('latin1')),
+                user, args.rounds)
+
+        codecs = [VersionedCodec(JSONCodec())]
+        if msgpack_available():
+            codecs.append(VersionedCodec(MsgpackCodec()))
+        else:
+            print('（未安装msgpack，跳过msgpack对比）')
+        for codec in codecs:
+            measure(f'{codec.name} TokenClaims', codec.encode, codec.decode, claims, args.rounds)
+        for codec in codecs:
+            measure(f'{codec.name} 统计数据', codec.encode, codec.decode, stats, args.rounds)
+        measure('pickle 统计数据 + latin1 [旧]',
+                lambda value: pickle.dumps(value).decode('latin1'),
+                lambda data: pickle.loads(data.encode('latin1')),
+                stats, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+缓存失效对Redis延迟的影响：KEYS + DEL（旧clear_pattern）、SCAN分批删除、按标签分批删除
+
+先写入大量无关键（模拟数百万 api_token:* / user_stats:*），再让一个探测线程持续执行GET，
+统计每种失效方式运行期间其他请求的延迟。需要一个真实的Redis实例，所有键都带有 --prefix 前缀，结束后清理。
+
+用法（在notification_manager目录下）:
+    python benchmarks/bench_cache_invalidation.py --redis-url redis://localhost:6379/15 --keys 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+import redis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import CacheManager
+
+
+def seed(client, prefix, total, pipeline_size=10000):
+    """写入total个无关键，模拟大键空间"""
+    pipe = client.pipeline(transaction=False)
+    for i in range(total):
+        pipe.set(f'{prefix}api_token:{i}', b'x', ex=3600)
+        if (i + 1) % pipeline_size == 0:
+            pipe.execute()
+    pipe.execute()
+
+
+def seed_targets(cache, prefix, count):
+    """写入count个属于同一用户的缓存键（既能按模式匹配也带有标签）"""
+    for i in range(count):
+        cache.set(f'{prefix}user_stats:42:{i}', {'n': i}, expire=3600, tags=(f'{prefix}user:42',))
+
+
+class Probe(threading.Thread):
+    """持续执行GET，记录每次往返耗时"""
+
+    def __init__(self, url, key):
+        super().__init__(daemon=True)
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.samples = []
+        self.running = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            start = time.perf_counter()
+            self.client.get(self.key)
+            if self.running.is_set():
+                self.samples.append(time.perf_counter() - start)
+
+    def measure(self, action):
+        self.samples = []
+        self.running.set()
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        self.running.clear()
+        return elapsed, list(self.samples)
+
+
+def report(label, elapsed, samples):
+    if not samples:
+        print(f"{label:<20} 耗时 {elapsed * 1000:>8.1f} ms  （期间没有完成任何探测请求）")
+        return
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<20} 耗时 {elapsed * 1000:>8.1f} ms  探测 {len(samples):>6} 次  "
+          f"p50 {statistics.median(samples) * 1000:>6.2f} ms  p99 {p99 * 1000:>7.2f} ms  "
+          f"最大 {samples[-1] * 1000:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='缓存失效期间的Redis延迟')
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL', 'redis://localhost:6379/15'))
+    parser.add_argument('--keys', type=int, default=1000000, help='无关键数量')
+    parser.add_argument('--targets', type=int, default=2000, help='每轮需要失效的键数量')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--prefix', default='bench_invalidation:')
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url)
+    cache = CacheManager(client, l1_ttl=0, batch_size=args.batch_size)
+    prefix = args.prefix
+    pattern = f'{prefix}user_stats:42:*'
+
+    def keys_and_delete():
+        keys = client.keys(pattern)
+        if keys:
+            client.delete(*keys)
+
+    print(f"写入 {args.keys} 个无关键...")
+    seed(client, prefix, args.keys)
+    probe = Probe(args.redis_url, f'{prefix}api_token:0')
+    probe.start()
+    try:
+        for label, action in (
+            ('KEYS + DEL', keys_and_delete),
+            ('SCAN clear_pattern', lambda: cache.clear_pattern(pattern)),
+            ('标签 invalidate_tags', lambda: cache.invalidate_tags(f'{prefix}user:42')),
+        ):
+            seed_targets(cache, prefix, args.targets)
+            elapsed, samples = probe.measure(action)
+            remaining = sum(1 for _ in client.scan_iter(match=pattern, count=args.batch_size))
+            report(label, elapsed, samples)
+            if remaining:
+                print(f"  剩余未删除 {remaining} 个键")
+    finally:
+        probe.stopped.set()
+        probe.join()
+        print("清理测试数据...")
+        batch = []
+        for key in client.scan_iter(match=f'{prefix}*', count=10000):
+            batch.append(key)
+            if len(batch) >= 10000:
+                client.unlink(*batch)
+                batch = []
+        if batch:
+            client.unlink(*batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+组合索引前后的查询延迟：在临时SQLite数据库中写入大量发送日志，
+先删除组合索引模拟旧数据库，测量仪表板计数、最近日志和平台查询，再执行迁移后重新测量（含user_stats计数读取）。
+
+用法（在notification_manager目录下）:
+    python benchmarks/bench_log_indexes.py --rows 2000000 --users 1000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+
+STATUSES = ['success'] * 8 + ['failed', 'pending']
+
+
+def seed(rows, users, platforms_per_user):
+    """用sqlite3直接批量写入，比ORM快得多"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        'INSERT INTO user (id, username, email, password_hash, is_active) VALUES (?, ?, ?, ?, 1)',
+        ((i, f'user{i}', f'user{i}@example.com', 'x') for i in range(1, users + 1))
+    )
+    conn.executemany(
+        'INSERT INTO notification_platform (user_id, name, platform_type, webhook_url, is_active) '
+        'VALUES (?, ?, ?, ?, ?)',
+        ((user_id, f'platform{n}', 'webhook', 'http://127.0.0.1/hook', int(n % 4 != 3))
+         for user_id in range(1, users + 1) for n in range(platforms_per_user))
+    )
+    start = datetime.utcnow() - timedelta(days=90)
+    rng = random.Random(42)
+
+    def logs():
+        for i in range(rows):
+            user_id = rng.randint(1, users)
+            yield (user_id, (user_id - 1) * platforms_per_user + 1, 'benchmark message',
+                   rng.choice(STATUSES), 200, start + timedelta(seconds=i * 3))
+
+    conn.executemany(
+        'INSERT INTO notification_log (user_id, platform_id, message, status, response_code, sent_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)', logs()
+    )
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def drop_indexes(db):
+    with db.engine.begin() as conn:
+        for name in ('ix_notification_log_user_status_sent_at', 'ix_notification_log_user_sent_at',
+                     'ix_notification_log_batch_id', 'ix_notification_platform_user_active_name'):
+            conn.execute(db.text(f'DROP INDEX IF EXISTS {name}'))
+        conn.execute(db.text('DROP TABLE IF EXISTS schema_version'))
+        conn.execute(db.text('DROP TABLE IF EXISTS user_stats'))
+
+
+def measure(label, func, repeat, users):
+    rng = random.Random(7)
+    samples = []
+    for _ in range(repeat):
+        user_id = rng.randint(1, users)
+        started = time.perf_counter()
+        func(user_id)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    print(f"  {label:<28} 平均 {sum(samples) / len(samples) * 1000:>9.3f} ms  "
+          f"p95 {samples[int(len(samples) * 0.95)] * 1000:>9.3f} ms")
+
+
+def run_queries(app_module, repeat, users, counters=False):
+    NotificationLog = app_module.NotificationLog
+    NotificationPlatform = app_module.NotificationPlatform
+
+    measure('仪表板计数 (user_id, status)',
+            lambda user_id: NotificationLog.query.filter_by(user_id=user_id, status='success').count(),
+            repeat, users)
+    if counters:
+        measure('仪表板计数 user_stats',
+                lambda user_id: app_module.stats_counters.get(user_id),
+                repeat, users)
+    measure('最近日志 ORDER BY sent_at',
+            lambda user_id: NotificationLog.query.filter_by(user_id=user_id)
+            .order_by(NotificationLog.sent_at.desc()).limit(10).all(),
+            repeat, users)
+    measure('启用平台 (user_id, 名称)',
+            lambda user_id: NotificationPlatform.query.filter_by(user_id=user_id, name='platform1', is_active=True).all(),
+            repeat, users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='组合索引前后的查询延迟')
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--platforms-per-user', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    import app as app_module
+    from migrations import upgrade
+
+    db = app_module.db
+    with app_module.app.app_context():
+        db.create_all()
+        drop_indexes(db)
+        print(f"写入 {args.rows} 条日志、{args.users} 个用户...")
+        started = time.perf_counter()
+        seed(args.rows, args.users, args.platforms_per_user)
+        print(f"写入耗时 {time.perf_counter() - started:.1f} 秒，数据库 {os.path.getsize(DB_PATH) / 1e6:.0f} MB")
+
+        print("迁移前（无组合索引）:")
+        run_queries(app_module, args.repeat, args.users)
+
+        started = time.perf_counter()
+        executed = upgrade(db)
+        print(f"执行迁移 {executed} 耗时 {time.perf_counter() - started:.1f} 秒")
+        with db.engine.connect() as conn:
+            conn.execute(db.text('ANALYZE'))
+        db.session.remove()
+
+        print("迁移后:")
+        run_queries(app_module, args.repeat, args.users, counters=True)
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+发送日志写入：请求内提交（LOG_WRITE_MODE=sync）与后台组提交（async）对比
+多个线程模拟并发的发送请求，每个请求写入若干条日志后提交，测量请求线程花在写日志上的时间和总提交次数。
+不发送Webhook，只测量数据库部分。
+
+用法（在notification_manager目录下）:
+    python benchmarks/bench_log_writer.py --threads 16 --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+
+
+def run(app_module, mode, threads, requests, platforms):
+    app, db = app_module.app, app_module.db
+    app.config['LOG_WRITE_MODE'] = mode
+    result = {'success': True, 'status_code': 200, 'response': 'ok'}
+    targets = [SimpleNamespace(id=index + 1) for index in range(platforms)]
+    latencies = []
+    lock = threading.Lock()
+    commits = []
+
+    def on_commit(conn):
+        commits.append(1)
+
+    with app.app_context():
+        db.event.listen(db.engine, 'commit', on_commit)
+
+    def worker(count):
+        samples = []
+        with app.app_context():
+            for index in range(count):
+                sent = [(platform, f'benchmark {index}', result) for platform in targets]
+                started = time.perf_counter()
+                app_module.record_results(1, sent)
+                db.session.commit()
+                samples.append(time.perf_counter() - started)
+            db.session.remove()
+        with lock:
+            latencies.extend(samples)
+
+    per_thread = requests // threads
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    request_time = time.perf_counter() - started
+    app_module.log_writer.flush()
+    total_time = time.perf_counter() - started
+
+    with app.app_context():
+        db.event.remove(db.engine, 'commit', on_commit)
+    latencies.sort()
+    print(f"  {mode:<6} 请求平均 {sum(latencies) / len(latencies) * 1000:>8.3f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:>8.3f} ms  "
+          f"全部请求 {request_time:>6.2f} s  写完日志 {total_time:>6.2f} s  提交 {len(commits)} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='发送日志写入方式对比')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--platforms', type=int, default=3, help='每个请求写入的日志条数')
+    args = parser.parse_args()
+
+    import app as app_module
+    from migrations import upgrade
+
+    with app_module.app.app_context():
+        upgrade(app_module.db)
+        user = app_module.User(username='bench', email='bench@example.com', password_hash='x')
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+
+    print(f"{args.threads} 个线程、{args.requests} 个请求、每个请求 {args.platforms} 条日志:")
+    for mode in ('sync', 'async'):
+        run(app_module, mode, args.threads, args.requests, args.platforms)
+
+    app_module.log_writer.stop()
+    with app_module.app.app_context():
+        print(f"日志总数 {app_module.NotificationLog.query.count()}，用户计数 {app_module.stats_counters.get(1)}")
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+模板渲染对比：旧方案（每个变量对整段内容执行一次replace）与编译后一次join渲染
+
+用法（在notification_manager目录下）:
+    python benchmarks/bench_template_render.py --rounds 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_engine import CompiledTemplate, TemplateCache
+
+
+def legacy_render(content, variables):
+    rendered_content = content
+    for key, value in variables.items():
+        rendered_content = rendered_content.replace(f'{{{{{key}}}}}', str(value))
+    return rendered_content
+
+
+def build_template(var_count, filler):
+    """var_count个变量，每个变量前有filler个字符的文本"""
+    names = [f'var_{i}' for i in range(var_count)]
+    content = ''.join('说明文字' * (filler // 4) + f'{{{{{name}}}}}\n' for name in names)
+    variables = {name: f'value-{i}' for i, name in enumerate(names)}
+    return content, names, variables
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模板渲染对比')
+    parser.add_argument('--rounds', type=int, default=20000)
+    args = parser.parse_args()
+
+    template_cache = TemplateCache()
+    for var_count, filler in ((3, 40), (10, 80), (30, 200), (100, 400)):
+        content, names, variables = build_template(var_count, filler)
+        template = SimpleNamespace(id=var_count, updated_at=datetime.utcnow(), content=content,
+                                   variables=[{'name': name} for name in names])
+        compiled = CompiledTemplate(content, names)
+        assert compiled.render(variables) == legacy_render(content, variables)
+
+        rounds = max(1000, args.rounds // var_count)
+        legacy_us = timeit.timeit(lambda: legacy_render(content, variables), number=rounds) / rounds * 1e6
+        cached_us = timeit.timeit(lambda: template_cache.get(template).render(variables), number=rounds) / rounds * 1e6
+        compile_us = timeit.timeit(lambda: CompiledTemplate(content, names), number=rounds) / rounds * 1e6
+        print(f"{var_count:>3} 个变量 {len(content):>6} 字符  replace循环 {legacy_us:>8.2f} µs  "
+              f"编译缓存+渲染 {cached_us:>8.2f} µs  ({legacy_us / cached_us:.1f}x)  首次编译 {compile_us:>8.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
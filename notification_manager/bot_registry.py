@@ -0,0 +1,64 @@
+"""
+通知机器人注册表
+缓存已解析配置的机器人实例，避免每条消息都重新构造机器人、解析Webhook配置。
+"""
+import threading
+from collections import OrderedDict
+
+
+class BotRegistry:
+    """按平台ID缓存机器人实例
+
+    缓存项记录平台配置版本 (platform_type, webhook_url)，配置变化后自动重建；
+    平台编辑或删除时调用invalidate立即移除。超过max_size时淘汰最久未使用的实例。
+    """
+
+    def __init__(self, bot_classes, max_size=1024):
+        self.bot_classes = bot_classes
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._bots = OrderedDict()  # platform_id -> (version, bot)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def version(platform):
+        return (platform.platform_type, platform.webhook_url)
+
+    def create(self, platform_type, webhook_url):
+        """构造机器人实例（不缓存），不支持的平台类型返回None"""
+        bot_class = self.bot_classes.get((platform_type or '').lower())
+        return bot_class(webhook_url) if bot_class else None
+
+    def get(self, platform):
+        """获取平台对应的机器人实例，不支持的平台类型返回None"""
+        version = self.version(platform)
+        with self._lock:
+            cached = self._bots.get(platform.id)
+            if cached is not None and cached[0] == version:
+                self._bots.move_to_end(platform.id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        bot = self.create(platform.platform_type, platform.webhook_url)
+        if bot is None:
+            return None
+        with self._lock:
+            self._bots[platform.id] = (version, bot)
+            self._bots.move_to_end(platform.id)
+            while len(self._bots) > self.max_size:
+                self._bots.popitem(last=False)
+        return bot
+
+    def invalidate(self, platform_id):
+        with self._lock:
+            self._bots.pop(platform_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._bots.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._bots), 'hits': self.hits, 'misses': self.misses}
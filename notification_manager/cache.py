@@ -0,0 +1,541 @@
+"""
+两级缓存
+L1: 进程内LRU（有容量上限和TTL），命中时不访问网络；
+L2: Redis，多进程共享。
+写入和删除时通过Redis pub/sub通知其他进程丢弃各自的L1副本；Redis不可用时L1单独作为进程内缓存使用。
+写入时可以给键打标签（如 user:{id}），标签在Redis中是一个集合，按标签失效时分批删除其中的键，
+不需要用KEYS扫描整个键空间。
+get_or_compute在缓存过期时只让一个调用方重新计算（进程内按键合并 + Redis锁跨进程互斥），
+其余调用方直接使用旧值；缓存快到期时按概率提前刷新（XFetch），避免大量请求同时落到数据库。
+缓存值用cache_codecs中的编码器序列化，Redis客户端需使用二进制连接（decode_responses=False）。
+"""
+import fnmatch
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from redis.exceptions import ResponseError
+
+from cache_codecs import VersionedCodec, JSONCodec
+from logger import LoggerMixin
+
+
+class LocalCache:
+    """进程内LRU缓存，保存编码后的数据，每次读取都解码出独立的副本"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (过期时间, 数据)
+        self._tags = {}  # tag -> {key}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, data, ttl, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, data, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        # 调用方需持有锁
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def delete_many(self, keys):
+        with self._lock:
+            return sum(1 for key in keys if self._remove(key))
+
+    def delete_tag(self, tag):
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def delete_pattern(self, pattern):
+        with self._lock:
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Flight:
+    """进程内一次正在进行的重新计算，同一个键的其他调用方等待它的结果"""
+    __slots__ = ('done', 'value', 'error', 'ok')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.ok = False
+
+
+class CacheManager(LoggerMixin):
+    """两级缓存管理器
+
+    - l1_size / l1_ttl: 进程内缓存的条数上限和最长保留秒数（不超过写入时的expire），
+      TTL同时限制了错过失效通知时读到旧数据的时间
+    - channel: 失效通知的pub/sub频道
+    - codec: 值编码器（默认紧凑JSON）
+    - batch_size: 按标签或模式失效时每批删除的键数（每批一次网络往返）
+    - tag_ttl: 标签集合的最短保留秒数，需不小于打标签的缓存项的expire
+    - stale_ttl: get_or_compute的值过期后继续保留、供重新计算期间使用的秒数
+    - lock_timeout: 重新计算锁的最长持有秒数，也是等待其他调用方计算结果的最长秒数
+    - early_refresh_beta: 提前刷新系数，0表示关闭，越大越早刷新
+    """
+
+    TAG_PREFIX = 'tag:'
+    LOCK_PREFIX = 'lock:'
+    # 只有锁的持有者才能释放锁
+    RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, redis_client, l1_size=2048, l1_ttl=30, channel='cache:invalidate', codec=None,
+                 batch_size=500, tag_ttl=86400, stale_ttl=60, lock_timeout=10, early_refresh_beta=1.0):
+        self.redis = redis_client
+        self.enabled = True
+        self.codec = VersionedCodec(codec or JSONCodec())
+        self.l1_ttl = l1_ttl
+        self.channel = channel
+        self.batch_size = batch_size
+        self.tag_ttl = tag_ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.early_refresh_beta = early_refresh_beta
+        self._flights = {}  # key -> _Flight
+        self._flights_lock = threading.Lock()
+        self._release_lock = redis_client.register_script(self.RELEASE_LOCK_SCRIPT) if redis_client is not None else None
+        self.local = LocalCache(l1_size)
+        self.node_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._counters = {
+            'l1_hits': 0,
+            'l1_misses': 0,
+            'l2_hits': 0,
+            'l2_misses': 0,
+            'decode_errors': 0,
+            'recomputes': 0,
+            'early_refreshes': 0,
+            'stale_served': 0,
+            'flight_waits': 0,
+            'lock_waits': 0,
+            'tag_invalidations': 0,
+            'keys_invalidated': 0,
+            'invalidations_sent': 0,
+            'invalidations_received': 0
+        }
+        if self.redis is not None and l1_ttl > 0:
+            threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def tag_key(self, tag):
+        return f'{self.TAG_PREFIX}{tag}'
+
+    def _dumps(self, value):
+        return self.codec.encode(value)
+
+    def _loads(self, data):
+        try:
+            return self.codec.decode(data)
+        except Exception:
+            # 无法识别的数据（如旧版本写入的pickle数据）按未命中处理
+            self._incr('decode_errors')
+            return None
+
+    def get(self, key):
+        """获取缓存"""
+        if self.l1_ttl > 0:
+            data = self.local.get(key)
+            if data is not None:
+                self._incr('l1_hits')
+                return self._loads(data)
+            self._incr('l1_misses')
+
+        if self.redis is None:
+            return None
+        try:
+            data = self.redis.get(key)
+        except Exception as e:
+            self.logger.warning(f"缓存获取失败 {key}: {e}")
+            return None
+        if not data:
+            self._incr('l2_misses')
+            return None
+
+        value = self._loads(data)
+        if value is None:
+            self._incr('l2_misses')
+            return None
+        self._incr('l2_hits')
+        if self.l1_ttl > 0:
+            self.local.set(key, data, self.l1_ttl)
+        return value
+
+    def set(self, key, value, expire=3600, tags=()):
+        """设置缓存（value需为编码器支持的基础类型），tags为该键所属的标签"""
+        try:
+            data = self._dumps(value)
+        except Exception as e:
+            self.logger.warning(f"缓存编码失败 {key}: {e}")
+            return False
+        if self.l1_ttl > 0:
+            self.local.set(key, data, min(expire, self.l1_ttl), tags)
+        if self.redis is None:
+            return True
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.setex(key, expire, data)
+            for tag in tags:
+                tag_key = self.tag_key(tag)
+                pipe.sadd(tag_key, key)
+                pipe.expire(tag_key, max(expire, self.tag_ttl))
+            self._queue_invalidation(pipe, key=key)
+            return pipe.execute()[0]
+        except Exception as e:
+            self.logger.warning(f"缓存设置失败 {key}: {e}")
+            return False
+
+    def delete(self, key):
+        """删除缓存"""
+        deleted = self.local.delete(key)
+        if self.redis is None:
+            return deleted
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(key)
+            self._queue_invalidation(pipe, key=key)
+            return pipe.execute()[0]
+        except Exception as e:
+            self.logger.warning(f"缓存删除失败 {key}: {e}")
+            return False
+
+    def exists(self, key):
+        """检查缓存是否存在"""
+        if self.l1_ttl > 0 and self.local.get(key) is not None:
+            return True
+        if self.redis is None:
+            return False
+        try:
+            return self.redis.exists(key)
+        except Exception as e:
+            self.logger.warning(f"缓存检查失败 {key}: {e}")
+            return False
+
+    def get_or_compute(self, key, compute, expire=300, tags=()):
+        """读取缓存，未命中或过期时调用compute()重新计算并写入
+
+        expire和tags也可以是以计算结果为参数的函数（如按Token有效期决定缓存时间）。
+        缓存中保存 {'v': 值, 'x': 过期时间戳, 'd': 计算耗时}，实际保留 expire + stale_ttl 秒：
+        - 未过期时按XFetch概率提前刷新，计算越慢、越接近过期越可能刷新；
+        - 需要刷新时只有拿到锁的调用方执行compute，其余调用方有旧值就返回旧值，
+          没有旧值（冷启动或已被失效）时等待计算结果，超过lock_timeout后自行计算。
+        """
+        entry = self._read_entry(key)
+        if entry is not None and not self._should_refresh(entry):
+            return entry['v']
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if entry is not None:
+                self._incr('stale_served')
+                return entry['v']
+            self._incr('flight_waits')
+            if flight.done.wait(self.lock_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                if flight.ok:
+                    return flight.value
+            return self._compute(key, compute, expire, tags)
+
+        try:
+            flight.value = self._refresh(key, compute, expire, tags, entry)
+            flight.ok = True
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _read_entry(self, key):
+        entry = self.get(key)
+        if isinstance(entry, dict) and 'v' in entry and 'x' in entry and 'd' in entry:
+            return entry
+        return None
+
+    def _should_refresh(self, entry):
+        now = time.time()
+        if now >= entry['x']:
+            return True
+        if self.early_refresh_beta <= 0:
+            return False
+        # XFetch: now - d * beta * ln(rand) >= 过期时间 时提前刷新
+        if now - entry['d'] * self.early_refresh_beta * math.log(1.0 - random.random()) >= entry['x']:
+            self._incr('early_refreshes')
+            return True
+        return False
+
+    def _refresh(self, key, compute, expire, tags, entry):
+        """（进程内的leader）通过Redis锁与其他进程互斥后重新计算"""
+        if self.redis is None:
+            return self._compute(key, compute, expire, tags)
+
+        lock_key = f'{self.LOCK_PREFIX}{key}'
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception as e:
+            self.logger.warning(f"缓存锁获取失败 {key}: {e}")
+            return self._compute(key, compute, expire, tags)
+
+        if acquired:
+            try:
+                return self._compute(key, compute, expire, tags)
+            finally:
+                try:
+                    self._release_lock(keys=[lock_key], args=[token])
+                except Exception as e:
+                    self.logger.warning(f"缓存锁释放失败 {key}: {e}")
+
+        # 其他进程正在计算
+        if entry is not None:
+            self._incr('stale_served')
+            return entry['v']
+        self._incr('lock_waits')
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self._read_entry(key)
+            if entry is not None:
+                return entry['v']
+            try:
+                if not self.redis.exists(lock_key):
+                    break
+            except Exception:
+                break
+        return self._compute(key, compute, expire, tags)
+
+    def _compute(self, key, compute, expire, tags):
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        self._incr('recomputes')
+        ttl = expire(value) if callable(expire) else expire
+        tags = tags(value) if callable(tags) else tags
+        entry = {'v': value, 'x': time.time() + ttl, 'd': round(delta, 4)}
+        self.set(key, entry, expire=int(math.ceil(ttl + self.stale_ttl)), tags=tags)
+        return value
+
+    def invalidate_tags(self, *tags):
+        """删除带有任一标签的全部缓存，返回删除的键数（Redis出错时返回None）
+
+        先把标签集合改名，之后新写入的键进入新集合，不会被这次失效误删或漏掉；
+        再用SSCAN分批取出键名，每批UNLINK并发布失效通知，单条命令的耗时与批大小成正比。
+        """
+        local_deleted = sum(self.local.delete_tag(tag) for tag in tags)
+        self._incr('tag_invalidations', len(tags))
+        if self.redis is None:
+            return local_deleted
+
+        deleted = 0
+        try:
+            for tag in tags:
+                purge_key = f'{self.tag_key(tag)}:purge:{uuid.uuid4().hex}'
+                try:
+                    self.redis.rename(self.tag_key(tag), purge_key)
+                except ResponseError:
+                    continue  # 标签下没有键
+                batch = []
+                for key in self.redis.sscan_iter(purge_key, count=self.batch_size):
+                    batch.append(key)
+                    if len(batch) >= self.batch_size:
+                        deleted += self._unlink_batch(batch)
+                        batch = []
+                if batch:
+                    deleted += self._unlink_batch(batch)
+                self.redis.unlink(purge_key)
+        except Exception as e:
+            self.logger.warning(f"缓存标签失效失败 {tags}: {e}")
+            return None
+        return deleted
+
+    def clear_pattern(self, pattern):
+        """清除匹配模式的缓存（SCAN分批，用于临时清理；常规失效请用标签）"""
+        self.local.delete_pattern(pattern)
+        if self.redis is None:
+            return True
+        try:
+            batch = []
+            for key in self.redis.scan_iter(match=pattern, count=self.batch_size):
+                batch.append(key)
+                if len(batch) >= self.batch_size:
+                    self._unlink_batch(batch, notify=False)
+                    batch = []
+            pipe = self.redis.pipeline(transaction=False)
+            if batch:
+                pipe.unlink(*batch)
+                self._incr('keys_invalidated', len(batch))
+            self._queue_invalidation(pipe, pattern=pattern)
+            pipe.execute()
+            return True
+        except Exception as e:
+            self.logger.warning(f"缓存模式清除失败 {pattern}: {e}")
+            return False
+
+    def _unlink_batch(self, keys, notify=True):
+        """一次往返删除一批键，并通知其他进程丢弃对应的L1副本"""
+        keys = [key.decode('utf-8') if isinstance(key, bytes) else key for key in keys]
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.unlink(*keys)
+        if notify:
+            # 从L2回填的L1条目没有标签，按键名删除本进程的副本
+            self.local.delete_many(keys)
+            self._queue_invalidation(pipe, keys=keys)
+        deleted = pipe.execute()[0]
+        self._incr('keys_invalidated', deleted)
+        return deleted
+
+    def _queue_invalidation(self, pipe, key=None, pattern=None, keys=None):
+        """在同一个pipeline中发布失效通知（不增加网络往返）"""
+        if self.l1_ttl <= 0:
+            return
+        message = {'node': self.node_id}
+        if pattern is not None:
+            message['pattern'] = pattern
+        elif keys is not None:
+            message['keys'] = keys
+        else:
+            message['key'] = key
+        pipe.publish(self.channel, json.dumps(message))
+        self._incr('invalidations_sent')
+
+    def _on_invalidation(self, raw):
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get('node') == self.node_id:
+            return
+        self._incr('invalidations_received')
+        if 'pattern' in message:
+            self.local.delete_pattern(message['pattern'])
+        elif 'keys' in message:
+            self.local.delete_many(message['keys'])
+        else:
+            self.local.delete(message.get('key'))
+
+    def _listen(self):
+        """订阅失效通知；连接中断重连后清空L1（期间可能错过通知）"""
+        retry_delay = 1
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.local.clear()
+                retry_delay = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._on_invalidation(message['data'])
+            except Exception as e:
+                self.logger.warning(f"缓存失效订阅中断，{retry_delay}秒后重连: {e}")
+                self.local.clear()
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 30)
+
+    def stats(self):
+        """各级缓存命中统计"""
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'codec': self.codec.name,
+            'decode_errors': counters['decode_errors'],
+            'batch_size': self.batch_size,
+            'recompute': {
+                'recomputes': counters['recomputes'],
+                'early_refreshes': counters['early_refreshes'],
+                'stale_served': counters['stale_served'],
+                'flight_waits': counters['flight_waits'],
+                'lock_waits': counters['lock_waits']
+            },
+            'l1': {
+                'enabled': self.l1_ttl > 0,
+                'size': len(self.local),
+                'max_entries': self.local.max_entries,
+                'ttl': self.l1_ttl,
+                'hits': counters['l1_hits'],
+                'misses': counters['l1_misses']
+            },
+            'l2': {
+                'enabled': self.redis is not None,
+                'hits': counters['l2_hits'],
+                'misses': counters['l2_misses']
+            },
+            'invalidations': {
+                'sent': counters['invalidations_sent'],
+                'received': counters['invalidations_received'],
+                'tags': counters['tag_invalidations'],
+                'keys': counters['keys_invalidated']
+            }
+        }
@@ -0,0 +1,85 @@
+"""
+缓存序列化编码
+缓存值只允许基础类型（dict/list/str/int/float/bool/None），不再pickle ORM对象。
+编码结果以2字节头开始: 格式版本 + 编码类型，读取时按头部选择解码器；
+头部不认识的数据（例如旧版本写入的pickle数据）按未命中处理，不会被反序列化。
+"""
+import json
+
+FORMAT_VERSION = 1
+
+
+class JSONCodec:
+    """紧凑JSON（无空格，UTF-8）"""
+    tag = b'J'
+    name = 'json'
+
+    def encode(self, value):
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    """msgpack二进制编码（需要安装msgpack）"""
+    tag = b'M'
+    name = 'msgpack'
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def encode(self, value):
+        return self._msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def msgpack_available():
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_codec(name='json'):
+    """按名称获取编码器；auto: 安装了msgpack时使用msgpack，否则使用JSON"""
+    if name == 'auto':
+        name = 'msgpack' if msgpack_available() else 'json'
+    if name == 'msgpack':
+        return MsgpackCodec()
+    if name == 'json':
+        return JSONCodec()
+    raise ValueError(f'不支持的缓存编码: {name}')
+
+
+class VersionedCodec:
+    """带版本头的编码器：用writer编码，按头部自动选择解码器"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.header = bytes([FORMAT_VERSION]) + writer.tag
+        self._readers = {writer.tag: writer, JSONCodec.tag: JSONCodec()}
+        if writer.tag != MsgpackCodec.tag and msgpack_available():
+            self._readers[MsgpackCodec.tag] = MsgpackCodec()
+
+    @property
+    def name(self):
+        return self.writer.name
+
+    def encode(self, value):
+        return self.header + self.writer.encode(value)
+
+    def decode(self, data):
+        """解码；版本或编码类型不认识时抛出ValueError"""
+        if isinstance(data, str):
+            data = data.encode('latin1')
+        if len(data) < 2 or data[0] != FORMAT_VERSION:
+            raise ValueError('未知的缓存数据格式')
+        reader = self._readers.get(data[1:2])
+        if reader is None:
+            raise ValueError('未知的缓存编码类型')
+        return reader.decode(data[2:])
@@ -0,0 +1,211 @@
+"""
+Webhook熔断器
+按平台维护 closed / open / half_open 三种状态：
+失败率或慢调用比例超过阈值时熔断，熔断期间直接快速失败，不再占用发送线程；
+熔断时间到后放行少量探测请求，探测成功则恢复，失败则继续熔断。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from logger import LoggerMixin
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _BreakerState:
+    __slots__ = ('state', 'outcomes', 'opened_at', 'probes')
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)  # (是否成功, 是否慢调用)
+        self.opened_at = 0.0
+        self.probes = 0
+
+
+class CircuitBreakerRegistry(LoggerMixin):
+    """熔断器集合
+
+    - window / min_calls: 统计最近window次调用，至少min_calls次才判断是否熔断
+    - failure_rate: 失败比例阈值
+    - slow_call_seconds / slow_call_rate: 耗时超过slow_call_seconds视为慢调用，慢调用比例阈值
+    - open_seconds: 熔断持续时间
+    - half_open_probes: 半开状态同时放行的探测请求数
+
+    redis_client不为空时，熔断状态写入Redis（带过期时间），其他Worker进程读取后同样快速失败。
+    """
+
+    def __init__(self, redis_client=None, window=20, min_calls=5, failure_rate=0.5,
+                 slow_call_seconds=5.0, slow_call_rate=0.8, open_seconds=30,
+                 half_open_probes=1, enabled=True, prefix='breaker:'):
+        self.redis = redis_client
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def _get(self, key):
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = _BreakerState(self.window)
+        return breaker
+
+    def allow(self, key):
+        """是否放行本次调用；返回False时调用方应直接快速失败"""
+        if not self.enabled:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._get(key)
+            if breaker.state == OPEN:
+                if now - breaker.opened_at < self.open_seconds:
+                    return False
+                breaker.state = HALF_OPEN
+                breaker.probes = 0
+            if breaker.state == HALF_OPEN:
+                if breaker.probes >= self.half_open_probes:
+                    return False
+                breaker.probes += 1
+                return True
+
+        # 本进程未熔断时，检查其他Worker是否已经熔断该平台
+        remaining = self._shared_open_remaining(key)
+        if remaining:
+            with self._lock:
+                breaker = self._get(key)
+                if breaker.state == CLOSED:
+                    breaker.state = OPEN
+                    breaker.opened_at = now - (self.open_seconds - remaining)
+            return False
+        return True
+
+    async def allow_async(self, key):
+        """allow的asyncio版本：需要读取Redis时在线程池中执行，不阻塞事件循环"""
+        if self.redis is None:
+            return self.allow(key)
+        return await asyncio.to_thread(self.allow, key)
+
+    def release(self, key):
+        """放行后未实际调用（例如被限流）时归还半开探测名额"""
+        if not self.enabled:
+            return
+        with self._lock:
+            breaker = self._get(key)
+            if breaker.state == HALF_OPEN and breaker.probes > 0:
+                breaker.probes -= 1
+
+    def record(self, key, success, latency):
+        """记录一次调用结果"""
+        if not self.enabled:
+            return
+
+        slow = latency >= self.slow_call_seconds
+        publish = None
+        with self._lock:
+            breaker = self._get(key)
+            if breaker.state == HALF_OPEN:
+                breaker.probes = max(0, breaker.probes - 1)
+                if success and not slow:
+                    breaker.state = CLOSED
+                    breaker.outcomes.clear()
+                    publish = CLOSED
+                else:
+                    self._trip(breaker)
+                    publish = OPEN
+            elif breaker.state == CLOSED:
+                breaker.outcomes.append((success, slow))
+                calls = len(breaker.outcomes)
+                if calls >= self.min_calls:
+                    failures = sum(1 for ok, _ in breaker.outcomes if not ok)
+                    slow_calls = sum(1 for _, is_slow in breaker.outcomes if is_slow)
+                    if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                        self._trip(breaker)
+                        publish = OPEN
+
+        if publish == OPEN:
+            self.logger.warning(f"熔断器打开: {key}")
+            self._publish_open(key)
+        elif publish == CLOSED:
+            self.logger.info(f"熔断器恢复: {key}")
+            self._publish_closed(key)
+
+    async def record_async(self, key, success, latency):
+        """record的asyncio版本：状态变化需要写入Redis，在线程池中执行"""
+        if self.redis is None:
+            self.record(key, success, latency)
+        else:
+            await asyncio.to_thread(self.record, key, success, latency)
+
+    def _trip(self, breaker):
+        breaker.state = OPEN
+        breaker.opened_at = time.monotonic()
+        breaker.probes = 0
+        breaker.outcomes.clear()
+
+    def _publish_open(self, key):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(self.prefix + str(key), OPEN, px=int(self.open_seconds * 1000))
+        except Exception as e:
+            self.logger.warning(f"熔断状态写入Redis失败 {key}: {e}")
+
+    def _publish_closed(self, key):
+        if self.redis is None:
+            return
+        try:
+            self.redis.delete(self.prefix + str(key))
+        except Exception as e:
+            self.logger.warning(f"熔断状态清除失败 {key}: {e}")
+
+    def _shared_open_remaining(self, key):
+        """其他进程发布的熔断剩余秒数，未熔断或Redis不可用时返回0"""
+        if self.redis is None:
+            return 0
+        try:
+            ttl = self.redis.pttl(self.prefix + str(key))
+        except Exception:
+            return 0
+        return ttl / 1000.0 if ttl and ttl > 0 else 0
+
+    def snapshot(self, key):
+        """熔断器当前状态"""
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                state, calls, failures, slow_calls, retry_in = CLOSED, 0, 0, 0, 0
+            else:
+                state = breaker.state
+                calls = len(breaker.outcomes)
+                failures = sum(1 for ok, _ in breaker.outcomes if not ok)
+                slow_calls = sum(1 for _, is_slow in breaker.outcomes if is_slow)
+                retry_in = 0
+                if state == OPEN:
+                    retry_in = max(0.0, self.open_seconds - (now - breaker.opened_at))
+                    if retry_in == 0:
+                        state = HALF_OPEN
+
+        shared_remaining = self._shared_open_remaining(key)
+        if state == CLOSED and shared_remaining:
+            state, retry_in = OPEN, shared_remaining
+
+        return {
+            'state': state,
+            'calls': calls,
+            'failure_rate': round(failures / calls, 3) if calls else 0.0,
+            'slow_call_rate': round(slow_calls / calls, 3) if calls else 0.0,
+            'retry_in': round(retry_in, 1),
+            'shared': self.redis is not None
+        }
@@ -0,0 +1,87 @@
+"""
+突发消息合并（摘要模式）
+聚合窗口内发往同一平台的消息合并成一条摘要，窗口结束时只调用一次Webhook。
+缓冲区在进程内，多进程部署时每个进程各自合并。
+"""
+import threading
+import uuid
+
+from logger import LoggerMixin
+
+
+def build_digest(messages, window, max_bodies=10):
+    """生成摘要消息：总条数 + 前max_bodies条内容"""
+    lines = [f"【消息汇总】{window}秒内共收到 {len(messages)} 条消息", ""]
+    for index, message in enumerate(messages[:max_bodies], 1):
+        lines.append(f"{index}. {message}")
+    if len(messages) > max_bodies:
+        lines.append(f"…… 其余 {len(messages) - max_bodies} 条已省略")
+    return "\n".join(lines)
+
+
+class _Window:
+    __slots__ = ('digest_id', 'window', 'messages', 'timer')
+
+    def __init__(self, window):
+        self.digest_id = uuid.uuid4().hex
+        self.window = window
+        self.messages = []
+        self.timer = None
+
+
+class Coalescer(LoggerMixin):
+    """按key聚合消息，窗口到期或消息数达到max_messages时调用flush(key, digest_id, window, messages)
+
+    flush总是在单独的线程中执行（定时器线程或缓冲区满时启动的线程），不阻塞调用add的请求线程或事件循环。
+    """
+
+    def __init__(self, flush, max_messages=500):
+        self.flush = flush
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def add(self, key, window, message):
+        """加入聚合窗口，返回该消息所属摘要的digest_id"""
+        full = None
+        with self._lock:
+            current = self._windows.get(key)
+            if current is None:
+                current = self._windows[key] = _Window(window)
+                current.timer = threading.Timer(window, self._flush_key, args=(key, current))
+                current.timer.daemon = True
+                current.timer.start()
+            current.messages.append(message)
+            digest_id = current.digest_id
+            if len(current.messages) >= self.max_messages:
+                full = current
+
+        if full is not None:
+            full.timer.cancel()
+            # 非守护线程：进程退出前等待摘要发送完成
+            threading.Thread(target=self._flush_key, args=(key, full), name='coalesce-flush').start()
+        return digest_id
+
+    def _flush_key(self, key, expected):
+        with self._lock:
+            # 窗口可能已被提前flush并重新打开，只处理本次定时对应的窗口
+            if self._windows.get(key) is not expected:
+                return
+            del self._windows[key]
+        try:
+            self.flush(key, expected.digest_id, expected.window, expected.messages)
+        except Exception as e:
+            self.logger.error(f"摘要消息发送失败 {key}: {e}", exc_info=True)
+
+    def flush_all(self):
+        """立即发送所有未到期的窗口（进程退出时调用）"""
+        with self._lock:
+            pending = list(self._windows.items())
+        for key, current in pending:
+            current.timer.cancel()
+            self._flush_key(key, current)
+
+    def pending(self):
+        """各key当前缓冲的消息数"""
+        with self._lock:
+            return {key: len(current.messages) for key, current in self._windows.items()}
@@ -31,6 +31,88 @@ class Config:
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL)
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', REDIS_URL)
     
+    # 进程内缓存（L1，位于Redis之前；Redis不可用时单独使用）
+    CACHE_L1_SIZE = int(os.environ.get('CACHE_L1_SIZE', 2048))  # 最多缓存的条数
+    CACHE_L1_TTL = float(os.environ.get('CACHE_L1_TTL', 30))  # 最长保留秒数，0表示关闭L1
+    CACHE_INVALIDATION_CHANNEL = os.environ.get('CACHE_INVALIDATION_CHANNEL', 'notification_manager:cache_invalidate')
+    CACHE_CODEC = os.environ.get('CACHE_CODEC', 'json')  # json / msgpack（需安装msgpack）/ auto
+    CACHE_INVALIDATION_BATCH = int(os.environ.get('CACHE_INVALIDATION_BATCH', 500))  # 按标签/模式失效时每批删除的键数
+    CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 60))  # 过期后仍可作为旧值返回的秒数
+    CACHE_LOCK_TIMEOUT = float(os.environ.get('CACHE_LOCK_TIMEOUT', 10))  # 重新计算锁的最长持有秒数
+    CACHE_EARLY_REFRESH_BETA = float(os.environ.get('CACHE_EARLY_REFRESH_BETA', 1.0))  # 提前刷新系数，0表示关闭
+    ROUTING_CACHE_TTL = int(os.environ.get('ROUTING_CACHE_TTL', 3600))  # 用户平台路由表缓存秒数（平台变更时立即失效）
+    
+    # 并发发送配置（单进程内同时在途的Webhook请求上限）
+    DISPATCH_MAX_IN_FLIGHT = int(os.environ.get('DISPATCH_MAX_IN_FLIGHT', 8))
+    BATCH_MAX_MESSAGES = int(os.environ.get('BATCH_MAX_MESSAGES', 500))  # /api/send_batch 单次最多消息数
+    MAIL_MERGE_MAX_ITEMS = int(os.environ.get('MAIL_MERGE_MAX_ITEMS', 10000))  # /api/send_template_batch 单次最多变量组数
+    MAIL_MERGE_CHUNK_SIZE = int(os.environ.get('MAIL_MERGE_CHUNK_SIZE', 200))  # 每块渲染、发送并写入日志的变量组数
+    
+    # HTTP传输层配置（Webhook连接池）
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 32))  # 缓存的主机连接池数量
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', DISPATCH_MAX_IN_FLIGHT))  # 每个主机的keep-alive连接数
+    HTTP_MAX_RESPONSE_BYTES = int(os.environ.get('HTTP_MAX_RESPONSE_BYTES', 64 * 1024))
+    
+    # ASGI入口（asgi.py，/api/send 和 /api/send_template 使用asyncio并发发送）
+    ASGI_MAX_IN_FLIGHT = int(os.environ.get('ASGI_MAX_IN_FLIGHT', 1000))  # 单进程同时在途的Webhook请求上限
+    ASGI_MAX_KEEPALIVE = int(os.environ.get('ASGI_MAX_KEEPALIVE', 100))  # 保持的keep-alive连接数
+    
+    # 异步发送队列配置
+    DELIVERY_MODE = os.environ.get('DELIVERY_MODE', 'sync')  # sync: 请求内发送; async: 入队后返回202
+    DELIVERY_WORKERS = int(os.environ.get('DELIVERY_WORKERS', 2))  # worker.py 启动的进程数
+    DELIVERY_EMBEDDED_WORKERS = int(os.environ.get('DELIVERY_EMBEDDED_WORKERS', 1))  # Web进程内的消费线程数（也负责执行重试）
+    DELIVERY_BATCH_SIZE = int(os.environ.get('DELIVERY_BATCH_SIZE', 10))
+    DELIVERY_POLL_INTERVAL = float(os.environ.get('DELIVERY_POLL_INTERVAL', 1.0))
+    DELIVERY_LOCK_TIMEOUT = int(os.environ.get('DELIVERY_LOCK_TIMEOUT', 300))  # 处理超时后任务重新入队
+    
+    # 发送日志写入（组提交）
+    LOG_WRITE_MODE = os.environ.get('LOG_WRITE_MODE', 'sync')  # sync: 随请求提交; async: 后台批量提交，进程崩溃可能丢失最近一批日志
+    LOG_WRITER_QUEUE_SIZE = int(os.environ.get('LOG_WRITER_QUEUE_SIZE', 10000))  # 队列满时由请求线程直接写入
+    LOG_WRITER_BATCH_SIZE = int(os.environ.get('LOG_WRITER_BATCH_SIZE', 500))  # 攒够该条数立即提交
+    LOG_WRITER_INTERVAL = float(os.environ.get('LOG_WRITER_INTERVAL', 0.2))  # 最长等待秒数
+    
+    # 发送日志保留与归档（python retention.py 定期执行）
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 90))  # 超过该天数的日志归档后从日志表删除，0表示不归档
+    LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR', 'log_archive')  # 相对路径位于instance目录下
+    LOG_RETENTION_BATCH = int(os.environ.get('LOG_RETENTION_BATCH', 1000))  # 每批（一个事务）删除的日志条数
+    
+    # 失败重试配置（指数退避 + 随机抖动，重试耗尽后进入死信表）
+    RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', 3))  # 0 表示不重试
+    RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', 5))
+    RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', 600))
+    
+    # 熔断配置（最近BREAKER_WINDOW次调用中失败率或慢调用比例超限时熔断）
+    BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', 'true').lower() in ['true', 'on', '1']
+    BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 20))
+    BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 5))
+    BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+    BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', 5))
+    BREAKER_SLOW_CALL_RATE = float(os.environ.get('BREAKER_SLOW_CALL_RATE', 0.8))
+    BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+    
+    # 重复消息去重（同一用户、平台、内容在窗口内只发送一次）
+    DEDUP_WINDOW = float(os.environ.get('DEDUP_WINDOW', 0))  # 去重窗口（秒），0表示关闭
+    DEDUP_BACKEND = os.environ.get('DEDUP_BACKEND', 'auto')  # auto: 有Redis时多进程共享; local: 仅进程内
+    DEDUP_MAX_ENTRIES = int(os.environ.get('DEDUP_MAX_ENTRIES', 100000))  # 进程内去重表的最大记录数
+    
+    # 突发消息合并配置（平台设置了合并窗口时生效）
+    COALESCE_MAX_BODIES = int(os.environ.get('COALESCE_MAX_BODIES', 10))  # 摘要中最多展示的消息条数
+    COALESCE_MAX_MESSAGES = int(os.environ.get('COALESCE_MAX_MESSAGES', 500))  # 窗口内消息达到该数量时提前发送
+    
+    # 邮件SMTP连接池
+    SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))  # 连接及单次命令超时（秒）
+    SMTP_IDLE_TIMEOUT = float(os.environ.get('SMTP_IDLE_TIMEOUT', 60))  # 空闲连接保留时间（秒）
+    SMTP_MAX_IDLE_PER_HOST = int(os.environ.get('SMTP_MAX_IDLE_PER_HOST', 2))  # 每个邮箱账号保留的空闲连接数
+    SMTP_PLAINTEXT_HOSTS = [host.strip() for host in os.environ.get('SMTP_PLAINTEXT_HOSTS', '').split(',') if host.strip()]  # 允许明文连接的主机（仅本地测试）
+    
+    # 出站限流配置（按平台机器人的频率限制发送，超限消息延迟发送）
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'auto')  # auto: 有Redis时多进程共享; local: 仅进程内
+    RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 60))  # 最多预占多少秒之后的发送时间，超过时到最早可发送的时间重新排队
+    RATE_LIMIT_MAX_INLINE_WAIT = float(os.environ.get('RATE_LIMIT_MAX_INLINE_WAIT', 1))  # 发送线程中最多等待秒数，更长的延迟放入发送队列
+    
     # 限流配置
     RATELIMIT_STORAGE_URL = REDIS_URL
     RATELIMIT_DEFAULT = "100 per hour"
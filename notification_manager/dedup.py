@@ -0,0 +1,115 @@
+"""
+重复消息抑制
+同一用户在去重窗口内发往同一平台的相同内容只发送一次，
+用于吸收客户端超时重试和告警管道的重复推送，在调用Webhook之前直接拦截。
+发送前先占用去重记录；发送失败且不会重试时释放，客户端随后的重试可以正常发送。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from logger import LoggerMixin
+
+
+def dedup_key(user_id, platform_id, message):
+    """去重维度: 用户 + 平台 + 消息内容摘要（16字节）"""
+    digest = hashlib.blake2b(message.encode('utf-8'), digest_size=16).digest()
+    return f'{user_id}:{platform_id}:'.encode('ascii') + digest
+
+
+class LocalDedupStore:
+    """进程内去重表：key -> 过期时间
+
+    窗口长度固定，插入顺序即过期顺序，只需从表头清理过期项；
+    超过max_entries时淘汰最早的记录，内存占用有上限。
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def add(self, key, window):
+        """记录key，返回False表示窗口内已存在（重复）"""
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries
+            while entries:
+                oldest, expires_at = next(iter(entries.items()))
+                if expires_at > now:
+                    break
+                del entries[oldest]
+
+            if key in entries:
+                return False
+            entries[key] = now + window
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MessageDeduplicator(LoggerMixin):
+    """去重窗口
+
+    redis_client不为空时用 SET NX PX 在多进程间共享去重记录，Redis不可用时退回进程内去重表。
+    window为0时关闭去重。
+    """
+
+    def __init__(self, redis_client=None, window=0, max_entries=100000, prefix='dedup:'):
+        self.redis = redis_client
+        self.window = window
+        self.prefix = prefix.encode('ascii')
+        self.local = LocalDedupStore(max_entries)
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def is_duplicate(self, user_id, platform_id, message):
+        """检查并占用一条消息的去重记录，窗口内重复时返回True"""
+        return self.check_many([(user_id, platform_id, message)])[0]
+
+    def check_many(self, entries):
+        """批量检查并占用 (user_id, platform_id, message) 的去重记录，返回是否重复的列表
+
+        Redis上用一个pipeline完成，多平台扇出只需一次往返。
+        """
+        if not self.enabled:
+            return [False] * len(entries)
+
+        keys = [dedup_key(*entry) for entry in entries]
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipe.set(self.prefix + key, 1, nx=True, px=int(self.window * 1000))
+                return [not claimed for claimed in pipe.execute()]
+            except Exception as e:
+                self.logger.warning(f"Redis去重不可用，使用进程内去重: {e}")
+        return [not self.local.add(key, self.window) for key in keys]
+
+    def release(self, user_id, platform_id, message):
+        """释放去重记录（发送失败且不会重试时调用），窗口内再次发送同一消息不再被忽略"""
+        self.release_many([(user_id, platform_id, message)])
+
+    def release_many(self, entries):
+        if not self.enabled or not entries:
+            return
+
+        keys = [dedup_key(*entry) for entry in entries]
+        if self.redis is not None:
+            try:
+                self.redis.delete(*(self.prefix + key for key in keys))
+                return
+            except Exception as e:
+                self.logger.warning(f"Redis去重不可用，使用进程内去重: {e}")
+        for key in keys:
+            self.local.discard(key)
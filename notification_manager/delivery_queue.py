@@ -0,0 +1,118 @@
+"""
+异步发送队列
+以数据库表作为任务队列（SQLite即可运行，无需Redis），由独立的Worker进程或进程内线程消费
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('notification')
+
+
+class DeliveryQueue:
+    """基于数据库表的发送任务队列
+
+    任务状态流转: queued -> processing -> done / failed
+    领取任务使用条件UPDATE（status='queued'）保证多进程下同一任务只会被一个Worker拿到；
+    processing状态超过lock_timeout未完成的任务视为Worker崩溃，会被重新放回队列。
+    """
+
+    def __init__(self, db, job_model, lock_timeout=300):
+        self.db = db
+        self.job_model = job_model
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    def new_batch_id():
+        return uuid.uuid4().hex
+
+    def enqueue(self, user_id, payload, batch_id=None, delay=0):
+        """持久化一个发送任务，返回任务对象（未提交，由调用方commit）"""
+        job = self.job_model(
+            batch_id=batch_id or self.new_batch_id(),
+            user_id=user_id,
+            payload=json.dumps(payload, ensure_ascii=False),
+            status='queued',
+            attempts=0,
+            available_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        self.db.session.add(job)
+        return job
+
+    def claim(self, limit=10):
+        """领取最多limit个可执行的任务"""
+        Job = self.job_model
+        session = self.db.session
+        now = datetime.utcnow()
+
+        # 回收超时未完成的任务
+        session.query(Job).filter(
+            Job.status == 'processing',
+            Job.locked_at < now - timedelta(seconds=self.lock_timeout)
+        ).update({'status': 'queued', 'locked_at': None}, synchronize_session=False)
+
+        candidates = session.query(Job.id).filter(
+            Job.status == 'queued',
+            Job.available_at <= now
+        ).order_by(Job.id).limit(limit).all()
+
+        claimed = []
+        for (job_id,) in candidates:
+            updated = session.query(Job).filter(
+                Job.id == job_id,
+                Job.status == 'queued'
+            ).update({
+                'status': 'processing',
+                'locked_at': now,
+                'attempts': Job.attempts + 1
+            }, synchronize_session=False)
+            if updated:
+                claimed.append(job_id)
+        session.commit()
+
+        if not claimed:
+            return []
+        return Job.query.filter(Job.id.in_(claimed)).order_by(Job.id).all()
+
+    def complete(self, job, error=None, commit=True):
+        """标记任务完成或失败"""
+        job.status = 'failed' if error else 'done'
+        job.error_message = error
+        job.finished_at = datetime.utcnow()
+        if commit:
+            self.db.session.commit()
+
+    def stats(self):
+        """各状态的任务数"""
+        Job = self.job_model
+        rows = self.db.session.query(Job.status, self.db.func.count(Job.id)).group_by(Job.status).all()
+        return {status: count for status, count in rows}
+
+
+def run_worker_loop(app, process_jobs, stop_event, batch_size=10, poll_interval=1.0):
+    """Worker主循环：不断领取并处理任务，队列为空时等待poll_interval秒"""
+    with app.app_context():
+        while not stop_event.is_set():
+            try:
+                handled = process_jobs(batch_size)
+            except Exception as e:
+                logger.error(f"发送队列处理异常: {e}", exc_info=True)
+                handled = 0
+            if not handled:
+                stop_event.wait(poll_interval)
+
+
+def start_embedded_workers(app, process_jobs, count, batch_size=10, poll_interval=1.0):
+    """在当前进程中启动后台线程消费队列（开发环境或单机部署使用）"""
+    stop_event = threading.Event()
+    for index in range(count):
+        thread = threading.Thread(
+            target=run_worker_loop,
+            args=(app, process_jobs, stop_event, batch_size, poll_interval),
+            name=f'delivery-worker-{index}',
+            daemon=True
+        )
+        thread.start()
+    return stop_event
@@ -0,0 +1,35 @@
+"""
+并发发送调度器
+将一次请求内多个平台的发送任务并行执行，结果顺序与任务顺序保持一致
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ConcurrentDispatcher:
+    """有界并发调度器
+
+    进程内共享一个线程池，max_in_flight 即同时在途的发送任务上限，
+    超出部分在线程池队列中排队等待。
+    注意：提交的任务内部不要再调用同一个调度器，否则可能因线程耗尽而死锁。
+    """
+
+    def __init__(self, max_in_flight=8):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight,
+            thread_name_prefix='dispatch'
+        )
+
+    def run(self, func, items):
+        """对每个item并发执行func，按items的顺序返回结果"""
+        items = list(items)
+        if len(items) <= 1:
+            # 单个任务直接在当前线程执行，省去线程切换
+            return [func(item) for item in items]
+
+        futures = [self._executor.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait=True):
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,176 @@
+"""
+发送日志后台批量写入（组提交）
+请求线程只把日志记录放入有界队列，后台线程攒够batch_size条或等待flush_interval秒后
+用一个事务批量插入，多个请求的日志共用一次提交（SQLite上即一次fsync），请求线程不再等待数据库锁。
+日志在提交前只存在于进程内存中，进程崩溃会丢失最近一批；正常退出时stop()会写完队列中的全部记录。
+"""
+import queue
+import threading
+import time
+
+from logger import LoggerMixin
+
+_WAKEUP = object()  # stop()放入队列，唤醒正在等待的写入线程
+
+
+class LogWriter(LoggerMixin):
+    """有界队列 + 后台写入线程；write(records)在一个事务中写入一批记录，失败时抛出异常"""
+
+    def __init__(self, write, max_queue=10000, batch_size=500, flush_interval=0.2, max_attempts=3):
+        self.write = write
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0  # 已放入队列、尚未写入或丢弃的记录数
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.overflow = 0  # 队列已满、退回请求线程写入的记录数
+        self.dropped = 0   # 多次写入失败后丢弃的记录数
+        self.failures = 0
+        self.max_depth = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+
+    def submit(self, records):
+        """放入写入队列，返回未能放入的记录（队列已满或已停止），由调用方直接写入"""
+        if self._stopping.is_set():
+            return list(records)
+        self._ensure_started()
+        rejected = []
+        for record in records:
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                rejected.append(record)
+        with self._lock:
+            self.enqueued += len(records) - len(rejected)
+            self._pending += len(records) - len(rejected)
+            self.overflow += len(rejected)
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return rejected
+
+    def _ensure_started(self):
+        # 首次使用时启动（多进程部署中fork之后每个进程各自启动）
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """等待第一条记录，之后在flush_interval内继续收集，最多batch_size条；停止后只取已入队的记录"""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if self._stopping.is_set():
+                timeout = 0
+            elif deadline is None:
+                timeout = self.flush_interval
+            else:
+                timeout = deadline - time.monotonic()
+            try:
+                record = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is _WAKEUP:
+                continue
+            batch.append(record)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+            elif self._stopping.is_set():
+                return
+
+    def _write_batch(self, batch):
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                self.write(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                if attempt == self.max_attempts:
+                    with self._lock:
+                        self.dropped += len(batch)
+                        self._pending -= len(batch)
+                        self._idle.notify_all()
+                    self.logger.error(f"发送日志写入失败，丢弃 {len(batch)} 条: {e}", exc_info=True)
+                    return
+                self.logger.warning(f"发送日志写入失败（第{attempt}次），稍后重试: {e}")
+                time.sleep(self.flush_interval * attempt)
+                continue
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self.last_batch_size = len(batch)
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+                self._pending -= len(batch)
+                self._idle.notify_all()
+            return
+
+    def flush(self, timeout=None):
+        """等待队列中已有的记录全部写入，返回是否在timeout内完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining if remaining is not None else self.flush_interval)
+        return True
+
+    def stop(self, timeout=30):
+        """停止接收新记录并写完队列（进程退出时调用）；之后submit的记录全部退回调用方"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put_nowait(_WAKEUP)
+            except queue.Full:
+                pass  # 队列已满时写入线程不会处于等待状态
+            thread.join(timeout)
+        if thread is None or not thread.is_alive():
+            # 写入线程未运行（如fork后尚未启动）或退出时又有记录入队，在当前线程写完
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    break
+                self._write_batch(batch)
+        if self._pending:
+            self.logger.error(f"进程退出时仍有 {self._pending} 条发送日志未写入")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'max_depth': self.max_depth,
+                'pending': self._pending,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'overflow': self.overflow,
+                'dropped': self.dropped,
+                'failures': self.failures,
+                'last_batch_size': self.last_batch_size,
+                'last_flush_ms': self.last_flush_ms
+            }
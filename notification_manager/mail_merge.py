@@ -0,0 +1,72 @@
+"""
+批量模板发送（邮件合并）
+变量逐条读取、逐条渲染，按块交给发送和写日志，内存占用只与块大小有关，与总条数无关。
+"""
+import json
+from itertools import islice
+
+
+def iter_ndjson(stream):
+    """逐行解析NDJSON，空行跳过，无法解析的行产出None"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def render_each(compiled, variable_sets, render_error):
+    """逐条渲染，产出 (序号, 消息, 错误信息)；渲染失败时消息为None
+
+    render_error为渲染失败时抛出的异常类型（如TemplateError）
+    """
+    for index, variables in enumerate(variable_sets):
+        if not isinstance(variables, dict):
+            yield index, None, '变量必须是JSON对象'
+            continue
+        try:
+            yield index, compiled.render(variables), None
+        except render_error as e:
+            yield index, None, str(e)
+
+
+def chunked(iterable, size):
+    """按size条一块产出列表"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class MergeSummary:
+    """整批发送结果统计；错误明细最多保留max_errors条"""
+
+    def __init__(self, max_errors=100):
+        self.max_errors = max_errors
+        self.total = 0
+        self.rendered = 0
+        self.success_count = 0
+        self.failed_count = 0
+        self.duplicates = 0
+        self.errors = []
+        self.truncated = False  # 超过单次上限，剩余部分未读取
+
+    def add_error(self, index, error):
+        self.failed_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'index': index, 'error': error})
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'success_count': self.success_count,
+            'failed_count': self.failed_count,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'truncated': self.truncated
+        }
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+数据库结构迁移
+db.create_all()只会创建不存在的表，不会修改已有的表。表结构的变化在这里按版本号登记，
+已执行的版本记录在schema_version表中，启动时只执行尚未执行的迁移。
+每个迁移都先检查现状再修改（列或索引已存在时跳过），全新数据库上重复执行也是安全的。
+
+用法（在notification_manager目录下）:
+    python migrations.py            # 执行未执行的迁移
+    python migrations.py --status   # 查看各迁移的执行情况
+"""
+import argparse
+import logging
+from datetime import datetime
+
+import sqlalchemy as sa
+
+logger = logging.getLogger('notification')
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """登记一个迁移，version需递增"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+def add_column_if_missing(conn, db, table_name, column_name):
+    """按模型定义为已有的表补充一列（只支持可空列）"""
+    inspector = sa.inspect(conn)
+    if not inspector.has_table(table_name):
+        return False
+    if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+        return False
+    column = db.metadata.tables[table_name].columns[column_name]
+    preparer = conn.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(sa.text(
+        f'ALTER TABLE {preparer.quote(table_name)} '
+        f'ADD COLUMN {preparer.quote(column_name)} {column_type}'
+    ))
+    return True
+
+
+def create_index_if_missing(conn, db, table_name, index_name, columns=None):
+    """创建索引：默认按模型中声明的索引；模型中已不再声明的索引需给出columns"""
+    inspector = sa.inspect(conn)
+    if not inspector.has_table(table_name):
+        return False
+    if index_name in {index['name'] for index in inspector.get_indexes(table_name)}:
+        return False
+    table = db.metadata.tables[table_name]
+    if columns:
+        index = sa.Index(index_name, *(table.c[column] for column in columns))
+    else:
+        index = next(index for index in table.indexes if index.name == index_name)
+    index.create(conn)
+    return True
+
+
+def drop_index_if_exists(conn, table_name, index_name):
+    """删除不再使用的索引"""
+    inspector = sa.inspect(conn)
+    if not inspector.has_table(table_name):
+        return False
+    if index_name not in {index['name'] for index in inspector.get_indexes(table_name)}:
+        return False
+    preparer = conn.dialect.identifier_preparer
+    statement = f'DROP INDEX {preparer.quote(index_name)}'
+    if conn.dialect.name in ('mysql', 'mariadb'):
+        statement += f' ON {preparer.quote(table_name)}'
+    conn.execute(sa.text(statement))
+    return True
+
+
+@migration(1, '平台限流/合并窗口列、日志摘要ID列')
+def add_platform_limit_and_digest_columns(conn, db):
+    add_column_if_missing(conn, db, 'notification_platform', 'rate_limit_per_minute')
+    add_column_if_missing(conn, db, 'notification_platform', 'coalesce_window')
+    add_column_if_missing(conn, db, 'notification_log', 'digest_id')
+
+
+@migration(2, '日志和平台查询的组合索引')
+def add_hot_query_indexes(conn, db):
+    # 迁移4已替换为 (user_id, status, sent_at)
+    create_index_if_missing(conn, db, 'notification_log', 'ix_notification_log_user_status', ('user_id', 'status'))
+    create_index_if_missing(conn, db, 'notification_log', 'ix_notification_log_user_sent_at')
+    create_index_if_missing(conn, db, 'notification_platform', 'ix_notification_platform_user_active_name')
+
+
+@migration(3, '用户发送计数表（从日志回填）')
+def backfill_user_stats(conn, db):
+    from stats_counters import rebuild
+    tables = db.metadata.tables
+    tables['user_stats'].create(conn, checkfirst=True)
+    rebuild(conn, tables['user_stats'], tables['notification_log'], tables['user'])
+
+
+@migration(4, '日志按状态翻页和按批次查询的索引')
+def add_log_query_indexes(conn, db):
+    # (user_id, status, sent_at) 同时满足按状态计数，替换原 (user_id, status) 索引
+    create_index_if_missing(conn, db, 'notification_log', 'ix_notification_log_user_status_sent_at')
+    drop_index_if_exists(conn, 'notification_log', 'ix_notification_log_user_status')
+    create_index_if_missing(conn, db, 'notification_log', 'ix_notification_log_batch_id')
+
+
+@migration(5, '死信保存模板消息的平台变体')
+def add_dead_letter_variants(conn, db):
+    add_column_if_missing(conn, db, 'dead_letter', 'variants')
+
+
+# 不放在db.metadata中，避免随create_all创建或被模型代码引用
+schema_version = sa.Table(
+    SCHEMA_VERSION_TABLE,
+    sa.MetaData(),
+    sa.Column('version', sa.Integer, primary_key=True),
+    sa.Column('description', sa.String(200)),
+    sa.Column('applied_at', sa.DateTime)
+)
+
+
+def upgrade(db):
+    """创建缺少的表，并按版本顺序执行尚未执行的迁移，返回本次执行的版本号列表"""
+    db.create_all()
+    schema_version.create(db.engine, checkfirst=True)
+
+    executed = []
+    for version, description, func in MIGRATIONS:
+        with db.engine.begin() as conn:
+            if conn.execute(sa.select(schema_version.c.version).where(schema_version.c.version == version)).first():
+                continue
+            func(conn, db)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        logger.info(f"数据库迁移 {version} 已执行: {description}")
+        executed.append(version)
+    return executed
+
+
+def status(db):
+    """返回 [(版本号, 说明, 执行时间或None)]"""
+    applied = {}
+    if sa.inspect(db.engine).has_table(SCHEMA_VERSION_TABLE):
+        with db.engine.connect() as conn:
+            applied = {row.version: row.applied_at for row in conn.execute(sa.select(schema_version))}
+    return [(version, description, applied.get(version)) for version, description, _ in MIGRATIONS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库结构迁移')
+    parser.add_argument('--status', action='store_true', help='只查看迁移执行情况')
+    args = parser.parse_args()
+
+    from app import app, db
+
+    with app.app_context():
+        if not args.status:
+            executed = upgrade(db)
+            print(f"已执行迁移: {executed}" if executed else "数据库已是最新版本")
+        for version, description, applied_at in status(db):
+            state = applied_at.strftime('%Y-%m-%d %H:%M:%S') if applied_at else '未执行'
+            print(f"{version:>4}  {state:<19}  {description}")
+
+
+if __name__ == '__main__':
+    main()
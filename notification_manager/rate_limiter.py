@@ -0,0 +1,151 @@
+"""
+出站限流
+按平台类型 + Webhook 维护令牌桶，遵守各平台机器人的发送频率限制。
+超出限制的消息延迟发送而不是直接丢弃：短暂的等待在发送线程中完成，
+更长的等待只按时间预占令牌，由调用方把消息放入发送队列延迟发送，不占用发送线程；
+需要等待超过max_wait时不预占，调用方在最早可发送的时间重新排队。
+"""
+import asyncio
+import hashlib
+import threading
+import time
+
+from logger import LoggerMixin
+
+# 各平台默认配额: (每分钟补充的令牌数, 桶容量)
+# 桶容量 + 每分钟补充数 <= 平台限制，保证任意60秒窗口内都不超限
+DEFAULT_QUOTAS = {
+    'dingtalk': (18, 2),   # 钉钉自定义机器人: 20条/分钟，超限会被限流10分钟
+    'wework': (18, 2),     # 企业微信群机器人: 20条/分钟
+    'feishu': (95, 5),     # 飞书自定义机器人: 100次/分钟，5次/秒
+    'telegram': (18, 2),   # Telegram: 同一群组20条/分钟
+}
+
+
+def quota_from_limit(per_minute):
+    """把“每分钟最多N条”换算成 (每分钟补充数, 桶容量)"""
+    per_minute = max(1, int(per_minute))
+    burst = max(1, per_minute // 10)
+    return (max(1, per_minute - burst), burst)
+
+
+def get_quota(platform_type, per_minute=None):
+    """获取平台配额，per_minute为平台上配置的覆盖值；返回None表示不限流"""
+    if per_minute:
+        return quota_from_limit(per_minute)
+    return DEFAULT_QUOTAS.get(platform_type)
+
+
+def limiter_key(platform_type, webhook_url):
+    """限流维度: 平台类型 + Webhook（同一个Webhook被多个平台记录引用时共享配额）"""
+    digest = hashlib.sha1(webhook_url.encode('utf-8')).hexdigest()[:16]
+    return f'{platform_type}:{digest}'
+
+
+class LocalTokenBucket:
+    """进程内令牌桶"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, last_refill]
+
+    def reserve(self, key, rate, capacity, max_wait):
+        """预占一个令牌，返回 (需要等待的秒数, 是否已预占)；等待超过max_wait时不预占，秒数为下一个空闲时间"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            wait = (1 - tokens) / rate if tokens < 1 else 0.0
+            if wait > max_wait:
+                self._buckets[key] = [tokens, now]
+                return wait, False
+            self._buckets[key] = [tokens - 1, now]
+            return wait, True
+
+
+class RedisTokenBucket:
+    """基于Redis的令牌桶，多进程/多实例共享配额"""
+
+    # 在Redis端原子地完成补充和预占，时间取Redis服务器时间避免各进程时钟不一致
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local max_wait = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens < 1 then wait = (1 - tokens) / rate end
+    if wait > max_wait then
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        return tostring(-wait)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate + wait) + 60)
+    return tostring(wait)
+    """
+
+    def __init__(self, redis_client, prefix='ratelimit:'):
+        self.redis = redis_client
+        self.prefix = prefix
+        self._script = redis_client.register_script(self.SCRIPT)
+
+    def reserve(self, key, rate, capacity, max_wait):
+        # 脚本用负数表示未预占（绝对值为下一个空闲时间）
+        wait = float(self._script(keys=[self.prefix + key], args=[rate, capacity, max_wait]))
+        return abs(wait), wait >= 0
+
+
+class RateLimiter(LoggerMixin):
+    """出站限流器
+
+    redis_client不为空时使用Redis共享配额，Redis不可用时自动退回进程内令牌桶。
+    acquire返回 (需要延迟发送的秒数, 是否已预占令牌): 秒数为0表示可以立即发送；
+    已预占时调用方延迟到该时间再发送，不再重复获取令牌；未预占（等待超过max_wait）时
+    秒数为下一个空闲时间，调用方届时重新获取令牌。
+    """
+
+    def __init__(self, redis_client=None, max_wait=60, max_inline_wait=1, enabled=True):
+        self.enabled = enabled
+        self.max_wait = max_wait
+        self.max_inline_wait = max_inline_wait
+        self.local = LocalTokenBucket()
+        self.shared = RedisTokenBucket(redis_client) if redis_client is not None else None
+
+    def acquire(self, key, quota):
+        """预占一个令牌；等待不超过max_inline_wait时在当前线程等待后返回 (0, True)，否则不等待"""
+        wait, reserved = self.reserve(key, quota)
+        if not reserved or wait > self.max_inline_wait:
+            return wait, reserved
+        if wait > 0:
+            time.sleep(wait)
+        return 0, True
+
+    async def acquire_async(self, key, quota):
+        """acquire的asyncio版本，等待期间不阻塞事件循环；Redis预占在线程池中执行"""
+        if self.shared is not None and self.enabled and quota:
+            wait, reserved = await asyncio.to_thread(self.reserve, key, quota)
+        else:
+            wait, reserved = self.reserve(key, quota)
+        if not reserved or wait > self.max_inline_wait:
+            return wait, reserved
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return 0, True
+
+    def reserve(self, key, quota):
+        """预占一个令牌，返回 (需要等待的秒数, 是否已预占)，不等待"""
+        if not self.enabled or not quota:
+            return 0.0, True
+
+        per_minute, capacity = quota
+        rate = per_minute / 60.0
+        if self.shared is not None:
+            try:
+                return self.shared.reserve(key, rate, capacity, self.max_wait)
+            except Exception as e:
+                self.logger.warning(f"Redis限流不可用，使用进程内限流: {e}")
+        return self.local.reserve(key, rate, capacity, self.max_wait)
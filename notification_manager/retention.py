@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+发送日志保留与归档
+超过保留天数的日志按发送日期写入压缩归档（每天一个gzip NDJSON文件），然后分批从日志表删除，
+日志表只保留近期数据。每批在一个短事务中删除，不长时间占用写锁。
+
+归档目录结构:
+    <LOG_ARCHIVE_DIR>/2026/01/notification_log-2026-01-15.ndjson.gz
+    <LOG_ARCHIVE_DIR>/manifest.json     # 各分区的文件、行数、时间范围
+
+每批先追加写入归档文件（一个gzip成员，写完fsync）再提交删除；两步之间进程崩溃时，
+该批日志会在下次执行时再归档一次，读取归档时按日志ID去重。
+
+用法（在notification_manager目录下）:
+    python retention.py                         # 归档并删除超过LOG_RETENTION_DAYS天的日志
+    python retention.py --days 30 --dry-run     # 只统计将要归档的条数
+    python retention.py --list                  # 查看已归档的分区
+    python retention.py --export 2026-01-15 [--to 2026-01-31] [--user 42]   # 输出归档日志（NDJSON）
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+
+PARTITION_PREFIX = 'notification_log-'
+MANIFEST = 'manifest.json'
+
+# 不归档的状态：等待重试的日志仍被重试任务引用
+RETAINED_STATUSES = ('pending',)
+
+
+def serialize_row(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+class LogArchive:
+    """按天分区的gzip NDJSON归档目录"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def partition_path(self, day):
+        return os.path.join(self.root, f'{day:%Y}', f'{day:%m}', f'{PARTITION_PREFIX}{day.isoformat()}.ndjson.gz')
+
+    def append(self, day, rows):
+        """把一批日志追加为分区文件的一个gzip成员（gzip可连续读取多个成员），返回写入的字节数"""
+        path = self.partition_path(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        body = ''.join(json.dumps(serialize_row(row), ensure_ascii=False) + '\n' for row in rows)
+        data = gzip.compress(body.encode('utf-8'))
+        with open(path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(data)
+
+    def manifest(self):
+        try:
+            with open(os.path.join(self.root, MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def record(self, day, rows, size):
+        """更新manifest中分区的行数和时间范围（写临时文件后替换，不会留下半个文件）"""
+        key = day.isoformat()
+        sent_at = [row['sent_at'] for row in rows if row.get('sent_at')]
+        with self._lock:
+            manifest = self.manifest()
+            entry = manifest.setdefault(key, {
+                'file': os.path.relpath(self.partition_path(day), self.root),
+                'rows': 0, 'bytes': 0, 'first_sent_at': None, 'last_sent_at': None
+            })
+            entry['rows'] += len(rows)
+            entry['bytes'] += size
+            if sent_at:
+                first, last = min(sent_at).isoformat(), max(sent_at).isoformat()
+                entry['first_sent_at'] = min(filter(None, [entry['first_sent_at'], first]))
+                entry['last_sent_at'] = max(filter(None, [entry['last_sent_at'], last]))
+            entry['archived_at'] = datetime.utcnow().isoformat()
+            path = os.path.join(self.root, MANIFEST)
+            temp = path + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(dict(sorted(manifest.items())), f, ensure_ascii=False, indent=2)
+            os.replace(temp, path)
+
+    def partitions(self, start=None, end=None):
+        """已归档的分区日期（升序），可按起止日期过滤（含两端）"""
+        days = sorted(date.fromisoformat(key) for key in self.manifest())
+        return [day for day in days if (start is None or day >= start) and (end is None or day <= end)]
+
+    def iter_rows(self, day, user_id=None):
+        """逐行读取一个分区，按日志ID去重，可只返回指定用户的日志"""
+        path = self.partition_path(day)
+        if not os.path.exists(path):
+            return
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if user_id is None or row['user_id'] == user_id:
+                    yield row
+
+
+def archive_logs(session, log_table, archive, cutoff, batch_size=1000, before_delete=None, dry_run=False):
+    """归档并删除sent_at早于cutoff的日志，返回 {'archived': 条数, 'batches': 批数, 'partitions': [日期]}
+
+    按日志ID顺序每次处理batch_size条，每批一个事务；before_delete(rows)在删除前于同一事务中调用
+    （清理引用、调整计数）。dry_run时只统计条数。
+    """
+    condition = sa.and_(log_table.c.sent_at < cutoff, log_table.c.status.notin_(RETAINED_STATUSES))
+    if dry_run:
+        count = session.execute(sa.select(sa.func.count()).select_from(log_table).where(condition)).scalar()
+        return {'archived': 0, 'batches': 0, 'partitions': [], 'expired': count}
+
+    summary = {'archived': 0, 'batches': 0, 'partitions': set()}
+    while True:
+        rows = session.execute(
+            sa.select(log_table).where(condition).order_by(log_table.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        rows = [dict(row) for row in rows]
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['sent_at'].date(), []).append(row)
+        try:
+            if before_delete is not None:
+                before_delete(rows)
+            session.execute(log_table.delete().where(log_table.c.id.in_([row['id'] for row in rows])))
+            sizes = {day: archive.append(day, day_rows) for day, day_rows in by_day.items()}
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        for day, day_rows in by_day.items():
+            archive.record(day, day_rows, sizes[day])
+        summary['archived'] += len(rows)
+        summary['batches'] += 1
+        summary['partitions'].update(by_day)
+    summary['partitions'] = sorted(day.isoformat() for day in summary['partitions'])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='发送日志保留与归档')
+    parser.add_argument('--days', type=int, help='保留天数，默认取LOG_RETENTION_DAYS')
+    parser.add_argument('--dry-run', action='store_true', help='只统计将要归档的条数')
+    parser.add_argument('--list', action='store_true', help='查看已归档的分区')
+    parser.add_argument('--export', type=date.fromisoformat, metavar='YYYY-MM-DD', help='输出该日（起）的归档日志')
+    parser.add_argument('--to', type=date.fromisoformat, metavar='YYYY-MM-DD', help='与--export一起使用，输出到该日（含）')
+    parser.add_argument('--user', type=int, help='与--export一起使用，只输出指定用户的日志')
+    args = parser.parse_args()
+
+    from app import app, log_archive, archive_expired_logs
+
+    if args.list:
+        for key, entry in log_archive.manifest().items():
+            print(f"{key}  {entry['rows']:>10} 行  {entry['bytes'] / 1024:>10.1f} KB  {entry['file']}")
+        return
+
+    if args.export:
+        for day in log_archive.partitions(args.export, args.to or args.export):
+            for row in log_archive.iter_rows(day, args.user):
+                sys.stdout.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return
+
+    days = args.days if args.days is not None else app.config['LOG_RETENTION_DAYS']
+    if days <= 0:
+        print("LOG_RETENTION_DAYS为0，不归档")
+        return
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    with app.app_context():
+        summary = archive_expired_logs(cutoff, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"{cutoff:%Y-%m-%d %H:%M} 之前待归档的日志: {summary['expired']} 条")
+    else:
+        print(f"已归档 {summary['archived']} 条日志（{summary['batches']} 批），分区: {', '.join(summary['partitions']) or '无'}")
+
+
+if __name__ == '__main__':
+    main()
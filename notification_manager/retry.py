@@ -0,0 +1,63 @@
+"""
+发送失败重试策略
+根据机器人返回的结果判断是否值得重试，并计算带随机抖动的指数退避时间
+"""
+import random
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+# 可重试的平台错误码（限流或平台繁忙）
+RETRYABLE_ERRCODES = {
+    -1,       # 钉钉/企业微信: 系统繁忙
+    130101,   # 钉钉: 发送速度太快而被限流
+    45009,    # 企业微信: 接口调用超过限制
+    9499,     # 飞书: Too Many Requests
+    11232,    # 飞书: 发送频率受限
+}
+
+
+def is_retryable(result):
+    """判断失败结果是否可以重试
+
+    可重试: 网络错误/超时(status_code=0)、5xx、408、429、限流/繁忙类错误码；
+    其余4xx和参数错误类的错误码重试也不会成功，直接判定失败。
+    熔断快速失败的结果单独记录，不在发送时立即安排重试；平台配置格式错误和被去重忽略的消息不重试。
+    """
+    if result.get('success') or result.get('duplicate') or result.get('circuit_open') or result.get('invalid_config'):
+        return False
+    if result.get('errcode') in RETRYABLE_ERRCODES:
+        return True
+    status_code = result.get('status_code') or 0
+    return status_code == 0 or status_code >= 500 or status_code in (408, 429)
+
+
+def parse_retry_after(value):
+    """解析Retry-After（秒数或HTTP日期），返回秒数，无法解析时返回None"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    now = datetime.now(retry_at.tzinfo) if retry_at.tzinfo else datetime.utcnow()
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+def backoff_delay(attempt, base=5, cap=600, retry_after=None):
+    """第attempt次重试前的等待秒数
+
+    指数退避 + Full Jitter: 在 [0, min(cap, base * 2^(attempt-1))] 内随机取值，
+    避免大量失败消息在同一时刻重试；服务端给出Retry-After时不早于该时间。
+    """
+    ceiling = min(cap, base * (2 ** max(0, attempt - 1)))
+    delay = random.uniform(0, ceiling)
+    retry_after = parse_retry_after(retry_after)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
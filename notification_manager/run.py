@@ -3,14 +3,24 @@
 通知管理系统启动脚本
 """
 
-from app import app, db
+from app import app, db, process_delivery_jobs
+from migrations import upgrade
+from delivery_queue import start_embedded_workers
 
 if __name__ == '__main__':
     # 创建数据库表
     with app.app_context():
-        db.create_all()
+        upgrade(db)
         print("数据库初始化完成！")
     
+    # 进程内异步发送Worker（独立部署时使用 python worker.py）
+    if app.config['DELIVERY_EMBEDDED_WORKERS']:
+        start_embedded_workers(
+            app, process_delivery_jobs, app.config['DELIVERY_EMBEDDED_WORKERS'],
+            batch_size=app.config['DELIVERY_BATCH_SIZE'],
+            poll_interval=app.config['DELIVERY_POLL_INTERVAL']
+        )
+    
     print("🧍‍♂️ 通知管理系统启动中...")
     print("访问地址: http://localhost:5555")
     print("按 Ctrl+C 停止服务")
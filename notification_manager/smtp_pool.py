@@ -0,0 +1,194 @@
+"""
+SMTP连接池
+按 (host, port, username) 复用已登录的SMTP会话，避免每封邮件都重新建立TCP连接、TLS握手和AUTH认证。
+空闲超时的连接会被关闭；复用的连接已被服务端断开时自动重新连接登录并重发一次。
+"""
+import smtplib
+import ssl
+import threading
+import time
+
+from logger import LoggerMixin
+
+# 服务端拒绝单封邮件的异常，连接仍可继续使用
+REJECTED_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+# 使用STARTTLS的提交端口，其余端口使用SMTP over SSL
+STARTTLS_PORTS = (25, 587)
+
+
+class SMTPPool(LoggerMixin):
+    """SMTP会话池
+
+    - idle_timeout: 连接空闲超过该秒数后关闭（大多数服务端会在几分钟内断开空闲连接）
+    - max_idle_per_key: 每个 (host, port, username) 最多保留的空闲连接数
+    - timeout: 连接和单次命令的超时秒数
+    - plaintext_hosts: 允许明文连接、服务端未声明AUTH时不登录的主机（只用于本地测试用的SMTP服务）
+
+    默认必须加密：端口25/587使用STARTTLS（服务端不支持时报错，不会明文发送密码），
+    其余端口使用SMTP over SSL；都校验服务端证书。
+    """
+
+    def __init__(self, idle_timeout=60, max_idle_per_key=2, timeout=10, plaintext_hosts=()):
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_key = max_idle_per_key
+        self.timeout = timeout
+        self.plaintext_hosts = frozenset(plaintext_hosts)
+        self._lock = threading.Lock()
+        self._idle = {}  # key -> [(smtp, last_used), ...]
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    def _connect(self, host, port, username, password):
+        if host in self.plaintext_hosts:
+            return self._connect_plaintext(host, port, username, password)
+        context = ssl.create_default_context()
+        if port in STARTTLS_PORTS:
+            server = smtplib.SMTP(host, port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP_SSL(host, port, timeout=self.timeout, context=context)
+        try:
+            server.ehlo()
+            if port in STARTTLS_PORTS:
+                if not server.has_extn('starttls'):
+                    raise smtplib.SMTPNotSupportedError(f'{host}:{port} 不支持STARTTLS，拒绝明文发送')
+                server.starttls(context=context)
+                server.ehlo()
+            if username and password:
+                server.login(username, password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    def _connect_plaintext(self, host, port, username, password):
+        # 仅用于plaintext_hosts中的主机：服务端支持时仍升级STARTTLS，未声明AUTH时不登录
+        server = smtplib.SMTP(host, port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if server.has_extn('starttls'):
+                server.starttls()
+                server.ehlo()
+            if username and password and server.has_extn('auth'):
+                server.login(username, password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _checkout(self, key):
+        """取出一个未超时的空闲连接，没有时返回None；顺带关闭所有超时的空闲连接"""
+        now = time.monotonic()
+        expired = []
+        server = None
+        with self._lock:
+            for pool_key, idle in list(self._idle.items()):
+                alive = []
+                for conn, last_used in idle:
+                    if now - last_used > self.idle_timeout:
+                        expired.append(conn)
+                    else:
+                        alive.append((conn, last_used))
+                if alive:
+                    self._idle[pool_key] = alive
+                else:
+                    del self._idle[pool_key]
+            idle = self._idle.get(key)
+            if idle:
+                server, _ = idle.pop()
+        for conn in expired:
+            self._close(conn)
+        return server
+
+    def _checkin(self, key, server):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+
+    def send(self, host, port, username, password, from_addr, to_addrs, message):
+        """发送一封邮件，失败时抛出异常"""
+        error = self.send_many(host, port, username, password, [(from_addr, to_addrs, message)])[0]
+        if error is not None:
+            raise error
+
+    def send_many(self, host, port, username, password, envelopes):
+        """在同一个连接上依次发送多封邮件
+
+        envelopes为 (from_addr, to_addrs, message) 列表；返回与之对应的异常列表，成功的位置为None。
+        单封邮件被拒绝不影响其余邮件；复用的连接已断开时重新连接登录，从中断处继续发送。
+        """
+        key = (host, port, username)
+        errors = [None] * len(envelopes)
+        position = 0
+        reconnected = False
+        while position < len(envelopes):
+            # 重连时直接新建连接，不再取可能同样失效的空闲连接
+            server = None if reconnected else self._checkout(key)
+            reused = server is not None
+            try:
+                if server is None:
+                    server = self._connect(host, port, username, password)
+                while position < len(envelopes):
+                    from_addr, to_addrs, message = envelopes[position]
+                    try:
+                        server.sendmail(from_addr, to_addrs, message)
+                        with self._lock:
+                            self.messages_sent += 1
+                    except REJECTED_ERRORS as e:
+                        errors[position] = e
+                        server.rset()
+                    position += 1
+            except OSError as e:
+                # smtplib的异常都继承自OSError；只有复用的旧连接才值得重连重试一次
+                if server is not None:
+                    self._close(server)
+                if reused and not reconnected:
+                    reconnected = True
+                    self.logger.info(f"SMTP连接已失效，重新连接 {host}:{port}: {e}")
+                    continue
+                errors[position:] = [e] * (len(envelopes) - position)
+                break
+            except Exception as e:
+                if server is not None:
+                    self._close(server)
+                errors[position:] = [e] * (len(envelopes) - position)
+                break
+            self._checkin(key, server)
+        return errors
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn, _ in conns]
+            self._idle.clear()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        """连接池统计"""
+        with self._lock:
+            return {
+                'connections_opened': self.connections_opened,
+                'messages_sent': self.messages_sent,
+                'idle_connections': {
+                    f'{host}:{port}:{username}': len(conns)
+                    for (host, port, username), conns in self._idle.items()
+                }
+            }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+按用户累计的发送计数
+写入发送日志时在同一个事务中累加 user_stats 表的计数，仪表板直接读取一行计数，不再对日志表执行COUNT。
+计数与日志不一致时（如直接修改了数据库）可以用对账任务从日志重新计算。
+
+用法（在notification_manager目录下）:
+    python stats_counters.py              # 重新计算全部用户的计数
+    python stats_counters.py --user 42    # 只重新计算指定用户
+"""
+import argparse
+from collections import Counter
+from datetime import datetime
+
+import sqlalchemy as sa
+
+# 计入统计的日志状态（与仪表板展示的成功/失败数一致）
+COUNTED_STATUSES = ('success', 'failed')
+
+
+def count_column(status):
+    return f'{status}_count'
+
+
+def status_deltas(changes):
+    """把 (user_id, 原状态, 新状态) 列表汇总为 {user_id: Counter}，新写入的日志原状态为None"""
+    deltas = {}
+    for user_id, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        counts = deltas.setdefault(user_id, Counter())
+        if old_status in COUNTED_STATUSES:
+            counts[old_status] -= 1
+        if new_status in COUNTED_STATUSES:
+            counts[new_status] += 1
+    return deltas
+
+
+def ensure_rows(conn, stats_table, user_ids):
+    """为还没有计数行的用户插入全0的行（已存在时忽略，并发插入也安全）"""
+    rows = [{'user_id': user_id, 'updated_at': datetime.utcnow(),
+             **{count_column(status): 0 for status in COUNTED_STATUSES}} for user_id in user_ids]
+    if not rows:
+        return
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(stats_table).on_conflict_do_nothing(index_elements=['user_id'])
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        statement = insert(stats_table).on_conflict_do_nothing(index_elements=['user_id'])
+    elif dialect in ('mysql', 'mariadb'):
+        statement = stats_table.insert().prefix_with('IGNORE')
+    else:
+        existing = {row[0] for row in conn.execute(
+            sa.select(stats_table.c.user_id).where(stats_table.c.user_id.in_(user_ids)))}
+        rows = [row for row in rows if row['user_id'] not in existing]
+        if not rows:
+            return
+        statement = stats_table.insert()
+    conn.execute(statement, rows)
+
+
+def apply_deltas(conn, stats_table, deltas):
+    """在当前事务中原子累加计数（UPDATE ... SET n = n + :delta），随日志一起提交或回滚"""
+    missing = []
+    for user_id, counts in deltas.items():
+        values = {count_column(status): stats_table.c[count_column(status)] + counts[status]
+                  for status in COUNTED_STATUSES if counts.get(status)}
+        if not values:
+            continue
+        values['updated_at'] = datetime.utcnow()
+        statement = stats_table.update().where(stats_table.c.user_id == user_id).values(**values)
+        if conn.execute(statement).rowcount == 0:
+            missing.append((user_id, statement))
+    if missing:
+        # 没有计数行的用户（如升级前注册、尚未对账）先补行再累加
+        ensure_rows(conn, stats_table, [user_id for user_id, _ in missing])
+        for _, statement in missing:
+            conn.execute(statement)
+
+
+def rebuild(conn, stats_table, log_table, user_table, user_ids=None):
+    """从日志重新计算计数（对账），返回处理的用户数
+
+    每个用户一条UPDATE，计数来自同一语句中的子查询，不会与并发写入的累加交错成中间值。
+    """
+    if user_ids is None:
+        user_ids = [row[0] for row in conn.execute(sa.select(user_table.c.id))]
+    ensure_rows(conn, stats_table, user_ids)
+    for user_id in user_ids:
+        values = {
+            count_column(status): sa.select(sa.func.count()).select_from(log_table).where(
+                log_table.c.user_id == user_id, log_table.c.status == status
+            ).scalar_subquery()
+            for status in COUNTED_STATUSES
+        }
+        values['updated_at'] = datetime.utcnow()
+        conn.execute(stats_table.update().where(stats_table.c.user_id == user_id).values(**values))
+    return len(user_ids)
+
+
+class UserStatsCounters:
+    """通过Flask-SQLAlchemy会话读写计数（与日志写入共用同一个事务）"""
+
+    def __init__(self, db, stats_model, log_model, user_model):
+        self.db = db
+        self.stats_table = stats_model.__table__
+        self.log_table = log_model.__table__
+        self.user_table = user_model.__table__
+
+    def record(self, changes):
+        """changes为 (user_id, 原状态, 新状态) 列表；不提交事务"""
+        deltas = status_deltas(changes)
+        if deltas:
+            apply_deltas(self.db.session.connection(), self.stats_table, deltas)
+
+    def get(self, user_id):
+        """返回 {status: 数量}，没有计数行时先从日志计算"""
+        row = self.db.session.execute(
+            sa.select(self.stats_table).where(self.stats_table.c.user_id == user_id)
+        ).first()
+        if row is None:
+            self.rebuild([user_id])
+            self.db.session.commit()
+            row = self.db.session.execute(
+                sa.select(self.stats_table).where(self.stats_table.c.user_id == user_id)
+            ).first()
+        return {status: getattr(row, count_column(status)) or 0 for status in COUNTED_STATUSES}
+
+    def rebuild(self, user_ids=None):
+        """对账：从日志重新计算（不提交事务）"""
+        return rebuild(self.db.session.connection(), self.stats_table, self.log_table, self.user_table, user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从发送日志重新计算用户计数')
+    parser.add_argument('--user', type=int, action='append', help='只处理指定用户，可重复')
+    args = parser.parse_args()
+
+    from app import app, db, stats_counters, invalidate_user_stats_cache
+
+    with app.app_context():
+        count = stats_counters.rebuild(args.user)
+        db.session.commit()
+        for user_id in args.user or []:
+            invalidate_user_stats_cache(user_id)
+        print(f"已重新计算 {count} 个用户的发送计数")
+
+
+if __name__ == '__main__':
+    main()
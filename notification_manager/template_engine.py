@@ -0,0 +1,225 @@
+"""
+消息模板编译与渲染
+模板内容只解析一次，拆成文本片段和 {{变量名}} 占位符，渲染时一次join完成；
+编译结果按 (模板ID, updated_at) 缓存，模板编辑后自动重新编译。
+
+模板内容也可以是按平台类型区分的JSON对象:
+    {"default": "纯文本 {{name}}",
+     "wework": "企业微信文本 {{name}}",
+     "dingtalk": {"msgtype": "markdown", "markdown": {"title": "通知", "text": "### {{name}}"}}}
+字符串变体作为该平台的文本消息；对象变体是该平台完整的请求体，编译成JSON文本模板，
+渲染时直接得到发送用的字节（变量值按JSON字符串转义），发送时不再构造字典。
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+
+PLACEHOLDER = re.compile(r'\{\{([^{}]+?)\}\}')
+
+
+class TemplateError(ValueError):
+    """模板变量校验失败"""
+
+    def __init__(self, message, missing=()):
+        super().__init__(message)
+        self.missing = list(missing)
+
+
+def parse_variables(raw):
+    """解析MessageTemplate.variables（JSON数组，元素为 {name, description} 或变量名），返回变量名列表"""
+    if not raw:
+        return []
+    try:
+        items = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        return []
+    if not isinstance(items, list):
+        return []
+    names = []
+    for item in items:
+        name = item.get('name') if isinstance(item, dict) else item
+        if isinstance(name, str) and name and name not in names:
+            names.append(name)
+    return names
+
+
+def json_escape(value):
+    """变量值转义后放入JSON字符串内部"""
+    return json.dumps(value, ensure_ascii=False)[1:-1]
+
+
+class RenderedMessage(str):
+    """按平台渲染的模板消息
+
+    本身是默认文本（用于日志、去重和没有变体的平台），
+    texts为各平台的文本变体，payloads为各平台预先渲染好的请求体（bytes）。
+    """
+
+    def __new__(cls, text, texts=None, payloads=None):
+        message = super().__new__(cls, text)
+        message.texts = texts or {}
+        message.payloads = payloads or {}
+        return message
+
+    def to_dict(self):
+        """写入发送队列时使用（JSON可序列化）"""
+        return {
+            'texts': self.texts,
+            'payloads': {key: payload.decode('utf-8') for key, payload in self.payloads.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, text, data):
+        return cls(text, data.get('texts'),
+                   {key: payload.encode('utf-8') for key, payload in (data.get('payloads') or {}).items()})
+
+
+def message_variant(message, platform_type):
+    """返回 (文本, 预渲染请求体)，没有对应平台变体时请求体为None"""
+    if isinstance(message, RenderedMessage):
+        return message.texts.get(platform_type, str(message)), message.payloads.get(platform_type)
+    return message, None
+
+
+class CompiledTemplate:
+    """编译后的模板
+
+    segments中偶数位置是文本，奇数位置是占位符原文；未提供值的占位符保留原文（与逐个replace的旧行为一致）。
+    declared为模板声明的变量，渲染时必须全部提供；escape用于转义变量值（如json_escape）。
+    """
+    __slots__ = ('segments', 'slots', 'placeholders', 'declared', 'escape')
+
+    def __init__(self, content, declared=(), escape=str):
+        parts = PLACEHOLDER.split(content)
+        segments = []
+        slots = []  # (segments中的位置, 变量名)
+        for index, part in enumerate(parts):
+            if index % 2:
+                slots.append((len(segments), part))
+                segments.append('{{' + part + '}}')
+            else:
+                segments.append(part)
+        self.segments = segments
+        self.slots = slots
+        self.placeholders = list(OrderedDict.fromkeys(name for _, name in slots))
+        self.declared = list(declared)
+        self.escape = escape
+
+    def missing(self, values):
+        return [name for name in self.declared if name not in values]
+
+    def render(self, values):
+        """渲染模板，缺少声明的变量时抛出TemplateError"""
+        missing = self.missing(values)
+        if missing:
+            raise TemplateError(f"缺少模板变量: {', '.join(missing)}", missing)
+        if not self.slots:
+            return self.segments[0]
+        parts = list(self.segments)
+        escape = self.escape
+        for position, name in self.slots:
+            if name in values:
+                parts[position] = escape(str(values[name]))
+        return ''.join(parts)
+
+
+class PlatformTemplate:
+    """按平台类型区分内容的模板，渲染结果为RenderedMessage"""
+
+    DEFAULT = 'default'
+
+    def __init__(self, variants, declared=()):
+        self.declared = list(declared)
+        self.texts = {}
+        self.payloads = {}
+        for platform_type, variant in variants.items():
+            if isinstance(variant, str):
+                self.texts[platform_type] = CompiledTemplate(variant)
+            else:
+                body = json.dumps(variant, ensure_ascii=False, separators=(',', ':'))
+                self.payloads[platform_type] = CompiledTemplate(body, escape=json_escape)
+        default = self.texts.pop(self.DEFAULT, None)
+        if default is None:
+            # 没有default时用第一个文本变体，都没有时用第一个请求体的JSON文本
+            default = next(iter(self.texts.values()), None)
+        if default is None:
+            default = CompiledTemplate(json.dumps(next(iter(variants.values())), ensure_ascii=False))
+        self.default = default
+        self.placeholders = list(OrderedDict.fromkeys(
+            name for compiled in [default, *self.texts.values(), *self.payloads.values()]
+            for name in compiled.placeholders
+        ))
+
+    def missing(self, values):
+        return [name for name in self.declared if name not in values]
+
+    def render(self, values):
+        missing = self.missing(values)
+        if missing:
+            raise TemplateError(f"缺少模板变量: {', '.join(missing)}", missing)
+        return RenderedMessage(
+            self.default.render(values),
+            {key: compiled.render(values) for key, compiled in self.texts.items()},
+            {key: compiled.render(values).encode('utf-8') for key, compiled in self.payloads.items()}
+        )
+
+
+def compile_template(content, declared=(), platform_types=()):
+    """编译模板内容：键全部是default或platform_types中平台类型的JSON对象按平台变体编译，其余按纯文本编译
+
+    内容恰好是JSON、但键不是平台类型的普通模板（如 {"alert": ..., "level": ...}）仍整体按文本发送
+    """
+    stripped = content.lstrip()
+    if stripped.startswith('{'):
+        try:
+            variants = json.loads(content)
+        except ValueError:
+            variants = None
+        if is_platform_variants(variants, platform_types):
+            return PlatformTemplate(variants, declared)
+    return CompiledTemplate(content, declared)
+
+
+def is_platform_variants(variants, platform_types):
+    return (isinstance(variants, dict) and bool(variants)
+            and all(key == PlatformTemplate.DEFAULT or key in platform_types for key in variants)
+            and all(isinstance(variant, (str, dict)) for variant in variants.values()))
+
+
+class TemplateCache:
+    """按模板ID缓存编译结果，缓存项记录updated_at，模板更新后重新编译；超过max_size时淘汰最久未使用的模板"""
+
+    def __init__(self, max_size=1024, platform_types=()):
+        self.max_size = max_size
+        self.platform_types = frozenset(platform_types)
+        self._lock = threading.Lock()
+        self._compiled = OrderedDict()  # template_id -> (updated_at, CompiledTemplate)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template):
+        version = template.updated_at
+        with self._lock:
+            cached = self._compiled.get(template.id)
+            if cached is not None and cached[0] == version:
+                self._compiled.move_to_end(template.id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        compiled = compile_template(template.content, parse_variables(template.variables), self.platform_types)
+        with self._lock:
+            self._compiled[template.id] = (version, compiled)
+            self._compiled.move_to_end(template.id)
+            while len(self._compiled) > self.max_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def invalidate(self, template_id):
+        with self._lock:
+            self._compiled.pop(template_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._compiled), 'hits': self.hits, 'misses': self.misses}
@@ -80,6 +80,43 @@ def test_send_to_specific_platform():
     except Exception as e:
         print(f"❌ 请求失败: {e}")
 
+def test_send_async():
+    """测试异步发送（返回202和batch_id）"""
+    url = f"{BASE_URL}/api/send"
+    
+    payload = {
+        "token": TEST_TOKEN,
+        "message": "异步发送的测试消息 🧍‍♂️",
+        "async": True
+    }
+    
+    headers = {
+        "Content-Type": "application/json"
+    }
+    
+    try:
+        print(f"异步发送测试通知到: {url}")
+        print("-" * 50)
+        
+        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        
+        print(f"响应状态码: {response.status_code}")
+        print(f"响应内容: {response.text}")
+        
+        if response.status_code == 202:
+            batch_id = response.json()["batch_id"]
+            print("✅ 任务已入队!")
+            status = requests.get(
+                f"{BASE_URL}/api/batch_status/{batch_id}",
+                headers={"Authorization": f"Bearer {TEST_TOKEN}"}
+            )
+            print(f"批次状态: {status.text}")
+        else:
+            print("❌ 入队失败!")
+            
+    except Exception as e:
+        print(f"❌ 请求失败: {e}")
+
 if __name__ == "__main__":
     print("🧍‍♂️ 通知管理系统 API 测试")
     print("=" * 50)
@@ -90,6 +127,9 @@ if __name__ == "__main__":
     print("\n2. 测试发送通知到指定平台:")
     test_send_to_specific_platform()
     
+    print("\n3. 测试异步发送:")
+    test_send_async()
+    
     print("\n测试完成!")
     print("\n使用说明:")
     print("1. 确保应用正在运行 (python run.py)")
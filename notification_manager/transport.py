@@ -0,0 +1,233 @@
+"""
+HTTP传输层
+所有NotificationBot共享：按主机维护keep-alive连接池，统一超时和响应体读取上限
+"""
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TransportResponse:
+    """已读取完毕的HTTP响应（响应体可能被截断）"""
+
+    def __init__(self, status_code, headers, content, truncated=False, encoding=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.truncated = truncated
+        self.encoding = encoding or 'utf-8'
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HTTPTransport:
+    """共享的HTTP连接池
+
+    - pool_connections: 缓存的主机连接池数量（每个主机一个池）
+    - pool_maxsize: 每个主机最多保持的keep-alive连接数
+    - connect_timeout/read_timeout: 连接和读取超时（秒）
+    - max_response_bytes: 响应体最多读取的字节数，超出部分丢弃并关闭该连接
+    """
+
+    def __init__(self, connect_timeout=3, read_timeout=10, pool_connections=32,
+                 pool_maxsize=8, max_response_bytes=64 * 1024):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_response_bytes = max_response_bytes
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'truncated': 0,
+            'bytes_read': 0
+        }
+
+    def post(self, url, json=None, data=None, headers=None):
+        """发送POST请求并读取（有上限的）响应体"""
+        self._incr('requests')
+        try:
+            response = self.session.post(
+                url,
+                json=json,
+                data=data,
+                headers=headers,
+                timeout=self.timeout,
+                stream=True
+            )
+        except requests.Timeout:
+            self._incr('timeouts')
+            raise
+        except Exception:
+            self._incr('errors')
+            raise
+
+        try:
+            # 多读1字节用于判断是否超出上限；完整读完后urllib3会自动把连接放回池中
+            content = response.raw.read(self.max_response_bytes + 1, decode_content=True)
+        except Exception:
+            self._incr('errors')
+            raise
+        finally:
+            # 未读完的响应会关闭底层连接，避免脏数据污染连接池
+            response.close()
+
+        truncated = len(content) > self.max_response_bytes
+        if truncated:
+            content = content[:self.max_response_bytes]
+            self._incr('truncated')
+        self._incr('bytes_read', len(content))
+
+        return TransportResponse(
+            status_code=response.status_code,
+            headers=response.headers,
+            content=content,
+            truncated=truncated,
+            encoding=response.encoding
+        )
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        """连接池统计信息"""
+        with self._lock:
+            counters = dict(self._counters)
+
+        pools = []
+        container = self._adapter.poolmanager.pools
+        for key in list(container.keys()):
+            pool = container.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': key.key_host,
+                'port': key.key_port,
+                'scheme': key.key_scheme,
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': self._idle_connections(pool)
+            })
+
+        return {
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+            'max_response_bytes': self.max_response_bytes,
+            'counters': counters,
+            'pools': pools
+        }
+
+    @staticmethod
+    def _idle_connections(pool):
+        # 连接池队列用None占位，非None的才是可复用的空闲连接
+        if pool.pool is None:
+            return 0
+        return sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+    def close(self):
+        """关闭所有连接"""
+        self.session.close()
+
+
+class AsyncHTTPTransport:
+    """asyncio版本的共享HTTP连接池（ASGI入口使用）
+
+    单个事件循环即可同时保持大量在途的Webhook请求，不需要为每个请求占用一个线程。
+    参数含义与HTTPTransport相同，max_connections为所有主机合计的连接数上限。
+    """
+
+    def __init__(self, connect_timeout=3, read_timeout=10, max_connections=1000,
+                 max_keepalive_connections=100, max_response_bytes=64 * 1024):
+        import httpx  # 仅ASGI入口需要httpx，WSGI部署不依赖
+
+        self.max_response_bytes = max_response_bytes
+        self.max_connections = max_connections
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            )
+        )
+        self._timeout_error = httpx.TimeoutException
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'truncated': 0,
+            'bytes_read': 0
+        }
+
+    async def post(self, url, json=None, data=None, headers=None):
+        """发送POST请求并读取（有上限的）响应体"""
+        self._incr('requests')
+        # httpx中原始字符串/字节请求体使用content参数，表单字典使用data参数
+        body = {'content': data} if isinstance(data, (str, bytes)) else {'data': data}
+        try:
+            async with self.client.stream('POST', url, json=json, headers=headers, **body) as response:
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > self.max_response_bytes:
+                        break
+        except self._timeout_error:
+            self._incr('timeouts')
+            raise
+        except Exception:
+            self._incr('errors')
+            raise
+
+        content = b''.join(chunks)
+        truncated = len(content) > self.max_response_bytes
+        if truncated:
+            content = content[:self.max_response_bytes]
+            self._incr('truncated')
+        self._incr('bytes_read', len(content))
+
+        return TransportResponse(
+            status_code=response.status_code,
+            headers=response.headers,
+            content=content,
+            truncated=truncated,
+            encoding=response.encoding
+        )
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'max_connections': self.max_connections,
+            'max_response_bytes': self.max_response_bytes,
+            'counters': counters
+        }
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+异步发送Worker
+从数据库任务队列中领取发送任务并投递，多个进程可并行消费同一个队列
+
+用法:
+    python worker.py                 # 进程数取 DELIVERY_WORKERS 配置
+    python worker.py --processes 4
+"""
+import argparse
+import multiprocessing
+import signal
+
+from config import get_config
+
+
+def run_worker(stop_event):
+    """单个Worker进程入口（在子进程中导入app，避免共享数据库连接）"""
+    from app import app, db, process_delivery_jobs, log_writer
+    from delivery_queue import run_worker_loop
+    from migrations import upgrade
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    with app.app_context():
+        upgrade(db)
+
+    run_worker_loop(
+        app,
+        process_delivery_jobs,
+        stop_event,
+        batch_size=app.config['DELIVERY_BATCH_SIZE'],
+        poll_interval=app.config['DELIVERY_POLL_INTERVAL']
+    )
+    # 子进程退出时不执行atexit，在这里写完后台队列中的发送日志
+    log_writer.stop()
+
+
+def main():
+    config = get_config()
+    parser = argparse.ArgumentParser(description='通知发送Worker')
+    parser.add_argument('--processes', type=int, default=config.DELIVERY_WORKERS, help='Worker进程数')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    stop_event = ctx.Event()
+    processes = [
+        ctx.Process(target=run_worker, args=(stop_event,), name=f'delivery-worker-{i}')
+        for i in range(max(1, args.processes))
+    ]
+
+    def shutdown(signum, frame):
+        print("正在停止Worker...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for process in processes:
+        process.start()
+    print(f"🧍‍♂️ 已启动 {len(processes)} 个发送Worker，按 Ctrl+C 停止")
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()